@@ -2,9 +2,36 @@ import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
 
+from sgis.store import ResultStore
+from sgis.sweep import aggregate
+
+
+# Plots take either a summary CSV or a DataFrame from summarize_store.
+def read_results(ifname):
+    if isinstance(ifname, pd.DataFrame):
+        return ifname
+    return pd.read_csv(ifname)
+
+
+# Per-point summary of a sweep's per-instance store, with the columns the
+# sweep prints (e.g. prefixes={"vf2": "vf2", "combined": "ref"}).
+def summarize_store(ifname, prefixes, weighted=False, reference="best"):
+    engines = list(prefixes)
+    points = {}
+    for key, records in sorted(ResultStore(ifname).instances().items()):
+        records = [r for r in records if r["engine"] in prefixes]
+        if len(records) == len(engines):
+            points.setdefault(key[:3], []).append(records)
+    rows = []
+    for (size, density, ratio), instances in sorted(points.items()):
+        rows.append({"ntarget": size, "density": density, "ratio": ratio,
+                     **aggregate(instances, engines, prefixes, weighted,
+                                 reference)})
+    return pd.DataFrame(rows)
+
 
 def expansion_plot(ifname, xlabel, ylabel, ax):
-    df = pd.read_csv(ifname)
+    df = read_results(ifname)
     raw = df.to_numpy()
     ax.set_ylabel(ylabel)
     ax.set_xlabel(xlabel)
@@ -14,7 +41,7 @@ def expansion_plot(ifname, xlabel, ylabel, ax):
 
 
 def time_plot(ifname, xlabel, ylabel, ax):
-    df = pd.read_csv(ifname)
+    df = read_results(ifname)
     ax.set_ylabel(ylabel)
     ax.set_xlabel(xlabel)
     ax.plot(df["ntarget"], df["vf2time"], label="\\verb|vf2|", linewidth=0.8)
@@ -23,7 +50,7 @@ def time_plot(ifname, xlabel, ylabel, ax):
 
 
 def error_plot(ifname, xlabel, ylabel, ax):
-    df = pd.read_csv(ifname)
+    df = read_results(ifname)
     ax.set_ylabel(ylabel)
     ax.set_xlabel(xlabel)
     ax.plot(df["ntarget"], df["vf2mean"], label="\\verb|vf2|", linewidth=0.8)
@@ -36,7 +63,7 @@ def error_plot(ifname, xlabel, ylabel, ax):
 
 
 def rollout_cost_plot(ifname, xlabel, ylabel, ax):
-    df = pd.read_csv(ifname)
+    df = read_results(ifname)
     ax.set_ylabel(ylabel)
     ax.set_xlabel(xlabel)
     ax.plot(df["ntarget"], df["hcost"], label="Greedy Cost", linewidth=0.8)
@@ -46,7 +73,7 @@ def rollout_cost_plot(ifname, xlabel, ylabel, ax):
 
 
 def rollout_time_plot(ifname, xlabel, ylabel, ax):
-    df = pd.read_csv(ifname)
+    df = read_results(ifname)
     ax.set_ylabel(ylabel)
     ax.set_xlabel(xlabel)
     ax.set_yscale("log", base=10)
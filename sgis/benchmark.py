@@ -0,0 +1,284 @@
+from dataclasses import dataclass
+from functools import partial
+from operator import attrgetter, methodcaller
+from typing import Callable
+import multiprocessing as mp
+import resource
+import signal
+import statistics
+import tracemalloc
+
+import networkx as nx
+
+from sgis import rolloutmatcher
+from sgis.ordering import RuleOrder
+from sgis.refinement import Combine, Heuristic
+from sgis.stats import SearchStats
+from sgis.treematcher import TreeMatcher
+from sgis.vf2 import GraphMatcher
+
+import time
+import random
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def bench(fn, *args, **kwargs):
+    init_time = time.perf_counter_ns()
+    result = fn(*args, **kwargs)
+    final_time = time.perf_counter_ns()
+    delta = final_time - init_time
+    logger.info(f"Benchmark for {str(fn)}: {delta} ns")
+    return result, delta
+
+
+# Without a seed the pairs are drawn from the global random state, as the
+# benchmarks in main.py and heuristic-main.py have always done.
+def generate_benchmark_pair(target_size, target_density,
+                            target_pattern_ratio_cap, seed=None):
+    rng = random if seed is None else random.Random(seed)
+    target = nx.binomial_graph(target_size, target_density, seed=rng)
+    return target, random_pattern(target, target_pattern_ratio_cap, rng)
+
+
+def generate_weighted_benchmark_pair(target_size, target_density,
+                                     target_pattern_ratio_cap, seed=None):
+    rng = random if seed is None else random.Random(seed)
+    target = nx.binomial_graph(target_size, target_density, seed=rng)
+    for u, v in target.edges:
+        target[u][v]["weight"] = rng.random()
+    return target, random_pattern(target, target_pattern_ratio_cap, rng)
+
+
+def random_pattern(target, target_pattern_ratio_cap, rng):
+    n = len(target)
+    s = set(rng.choices(range(n), k=int(n * target_pattern_ratio_cap)))
+    sub = target.subgraph(s)
+    largest_cc = max(nx.connected_components(sub), key=len)
+    return target.subgraph(largest_cc)
+
+
+# Each instance draws its graphs from its own seed, derived from the sweep
+# seed and the instance's place in the sweep, so results do not depend on
+# how instances are scheduled and any instance can be regenerated alone.
+def instance_seed(seed, size, density, ratio, iteration):
+    return random.Random(
+        f"{seed}:{size}:{density}:{ratio}:{iteration}").getrandbits(63)
+
+
+def parse_sizes(items):
+    sizes = []
+    for item in items:
+        if ":" in item:
+            sizes.extend(range(*map(int, item.split(":"))))
+        else:
+            sizes.append(int(item))
+    return sizes
+
+
+# How an engine is run: construct(target, pattern) builds the matcher,
+# including any refinement tables, search(matcher) runs the search and
+# expansions(matcher), if given, counts the nodes it expanded. Weighted
+# engines search for an embedding's cost. Engines with `stats` take a
+# SearchStats as construct(target, pattern, stats=...). ordering(matcher),
+# if given, is the RuleOrdering of an engine that reorders its rules.
+@dataclass(frozen=True)
+class EngineSpec:
+    construct: Callable
+    search: Callable
+    expansions: Callable = None
+    stats: bool = False
+    ordering: Callable = None
+
+
+@dataclass
+class Measurement:
+    result: object
+    expansions: int
+    construct_ns: int
+    search_ns: int
+    construct_cpu_ns: int
+    search_cpu_ns: int
+    peak_memory: int = None
+    stats: dict = None
+    ordering: dict = None
+
+
+# Builds and runs the engine `warmup` times untimed, then `repeats` times
+# timed, each on a fresh matcher since searches leave state behind. Times
+# are medians over the repeats, wall time from perf_counter_ns and CPU time
+# from process_time_ns. With `memory`, one further run under tracemalloc
+# records the peak allocation in bytes; it is kept apart from the timed
+# runs because tracing slows allocation down. Likewise `stats` adds a run
+# with a SearchStats, whose as_dict() is kept, for engines whose spec
+# supports it. For engines that reorder their rules, the as_dict() of the
+# last timed run's RuleOrdering is kept.
+def measure(spec, target, pattern, repeats=1, warmup=0, memory=False,
+            stats=False):
+    if repeats < 1:
+        raise ValueError(f"repeats must be at least 1, got {repeats}")
+    if stats and not spec.stats:
+        raise ValueError("engine does not collect search statistics")
+    for _ in range(warmup):
+        spec.search(spec.construct(target, pattern))
+
+    samples = []
+    for _ in range(repeats):
+        t0, c0 = time.perf_counter_ns(), time.process_time_ns()
+        matcher = spec.construct(target, pattern)
+        t1, c1 = time.perf_counter_ns(), time.process_time_ns()
+        result = spec.search(matcher)
+        t2, c2 = time.perf_counter_ns(), time.process_time_ns()
+        samples.append((t1 - t0, t2 - t1, c1 - c0, c2 - c1))
+
+    expansions = None
+    if spec.expansions is not None:
+        expansions = spec.expansions(matcher)
+    ordering = None
+    if spec.ordering is not None:
+        ordering = spec.ordering(matcher).as_dict()
+
+    peak_memory = None
+    if memory:
+        tracemalloc.start()
+        try:
+            spec.search(spec.construct(target, pattern))
+            _, peak_memory = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    search_stats = None
+    if stats:
+        search_stats = SearchStats()
+        spec.search(spec.construct(target, pattern, stats=search_stats))
+        search_stats = search_stats.as_dict()
+
+    construct_ns, search_ns, construct_cpu_ns, search_cpu_ns = (
+        int(statistics.median(column)) for column in zip(*samples))
+    return Measurement(result, expansions, construct_ns, search_ns,
+                       construct_cpu_ns, search_cpu_ns, peak_memory,
+                       search_stats, ordering)
+
+
+# Outcomes of measure_isolated
+OK = "ok"
+TIMEOUT = "timeout"
+OOM = "oom"
+ERROR = "error"
+
+
+def _measure_child(conn, spec, target, pattern, memory_limit, kwargs):
+    if memory_limit is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    try:
+        conn.send((OK, measure(spec, target, pattern, **kwargs)))
+    except MemoryError:
+        conn.send((OOM, None))
+    except Exception as e:
+        logger.warning(f"Engine run failed: {e!r}")
+        conn.send((ERROR, None))
+
+
+# measure() in a forked child, so a run that hangs, exhausts memory or
+# crashes the interpreter costs only its own result. `timeout` is in
+# seconds of wall time and `memory_limit` caps the child's address space
+# in bytes, which includes the interpreter it inherits. Returns the status
+# and a Measurement; for anything but OK the measurement holds only a
+# time in search_ns: the timeout itself for TIMEOUT, the point at which
+# the run's true time is censored, and otherwise the wall time until the
+# run failed.
+def measure_isolated(spec, target, pattern, timeout=None, memory_limit=None,
+                     **kwargs):
+    ctx = mp.get_context("fork")
+    receiver, sender = ctx.Pipe(duplex=False)
+    start = time.perf_counter_ns()
+    process = ctx.Process(
+        target=_measure_child,
+        args=(sender, spec, target, pattern, memory_limit, kwargs))
+    process.start()
+    sender.close()
+
+    status, measurement = TIMEOUT, None
+    if receiver.poll(timeout):
+        try:
+            status, measurement = receiver.recv()
+        except EOFError:
+            # Died without reporting; SIGKILL is what the OOM killer sends
+            process.join()
+            status = OOM if process.exitcode == -signal.SIGKILL else ERROR
+    elapsed = time.perf_counter_ns() - start
+    if process.is_alive():
+        process.kill()
+    process.join()
+    receiver.close()
+
+    if status == TIMEOUT:
+        elapsed = int(timeout * 1e9)
+    if measurement is None:
+        measurement = Measurement(None, None, None, elapsed, None, None)
+    return status, measurement
+
+
+ENGINES = {
+    "vf2": EngineSpec(GraphMatcher, methodcaller("subgraph_is_isomorphic"),
+                      methodcaller("n_expanded_nodes"), stats=True),
+    "union": EngineSpec(partial(TreeMatcher, heuristic=Heuristic.UNION),
+                        methodcaller("subgraph_is_isomorphic"),
+                        methodcaller("n_expanded_nodes"), stats=True),
+    "levels": EngineSpec(partial(TreeMatcher, heuristic=Heuristic.LEVEL),
+                         methodcaller("subgraph_is_isomorphic"),
+                         methodcaller("n_expanded_nodes"), stats=True),
+    "combined": EngineSpec(
+        partial(TreeMatcher, heuristic=(Heuristic.LEVEL, Heuristic.UNION),
+                combine=Combine.ANY),
+        methodcaller("subgraph_is_isomorphic"),
+        methodcaller("n_expanded_nodes"), stats=True),
+    "vf2-adaptive": EngineSpec(
+        partial(GraphMatcher, rule_order=RuleOrder.ADAPTIVE),
+        methodcaller("subgraph_is_isomorphic"),
+        methodcaller("n_expanded_nodes"),
+        ordering=attrgetter("rule_ordering")),
+    "union-adaptive": EngineSpec(
+        partial(TreeMatcher, heuristic=Heuristic.UNION,
+                rule_order=RuleOrder.ADAPTIVE),
+        methodcaller("subgraph_is_isomorphic"),
+        methodcaller("n_expanded_nodes"),
+        ordering=attrgetter("rule_ordering")),
+}
+
+WEIGHTED_ENGINES = {
+    "heuristic": EngineSpec(rolloutmatcher.GraphMatcher,
+                            lambda GM: GM.heuristic_isomorphism()[0]),
+    "best": EngineSpec(rolloutmatcher.GraphMatcher,
+                       lambda GM: GM.best_isomorphism()[0]),
+    "rollout": EngineSpec(rolloutmatcher.GraphMatcher,
+                          lambda GM: GM.rollout_isomorphism()[0]),
+    "beam": EngineSpec(rolloutmatcher.GraphMatcher,
+                       lambda GM: GM.beam_isomorphism(adaptive=True)[0]),
+}
+
+
+# Runners used by main.py, returning (result, expansions, search time in ns)
+def test_graphmatcher(G, H):
+    m = measure(ENGINES["vf2"], G, H)
+    logger.info(f"\t VF2 Expansions: {m.expansions}")
+    return m.result, m.expansions, m.search_ns
+
+
+def test_union_treematcher(G, H):
+    m = measure(ENGINES["union"], G, H)
+    logger.info(f"\t Refinement (union) Expansions: {m.expansions}")
+    return m.result, m.expansions, m.search_ns
+
+
+def test_levels_treematcher(G, H):
+    m = measure(ENGINES["levels"], G, H)
+    logger.info(f"\t Refinement (levels) Expansions: {m.expansions}")
+    return m.result, m.expansions, m.search_ns
+
+
+def test_combined_treematcher(G, H):
+    m = measure(ENGINES["combined"], G, H)
+    logger.info(f"\t Refinement (combined) Expansions: {m.expansions}")
+    return m.result, m.expansions, m.search_ns
@@ -0,0 +1,133 @@
+from itertools import product
+import argparse
+import json
+import os
+
+import networkx as nx
+import numpy as np
+
+from sgis.benchmark import (
+    generate_benchmark_pair,
+    generate_weighted_benchmark_pair,
+    instance_seed,
+    parse_sizes,
+)
+
+MANIFEST = "manifest.json"
+
+
+def instance_name(size, density, ratio, iteration):
+    return f"n{size}_p{density}_r{ratio}_{iteration}.npz"
+
+
+# An instance is stored as its target's edge array, in G.edges order, the
+# target's node count, the pattern's node subset (patterns are induced
+# subgraphs of the target) and, for weighted instances, edge weights in
+# the same order as the edges.
+def save_instance(path, target, pattern, weighted):
+    arrays = {
+        "n": np.array(len(target)),
+        "edges": np.array(list(target.edges), dtype=np.int32).reshape(-1, 2),
+        "pattern": np.array(list(pattern), dtype=np.int32),
+    }
+    if weighted:
+        arrays["weights"] = np.array(
+            [w for _, _, w in target.edges(data="weight")])
+    np.savez_compressed(path, **arrays)
+
+
+# Re-adding the edges in their stored order rebuilds the same adjacency
+# order, so matchers expand the same nodes as on the generated graphs.
+def load_instance(path):
+    with np.load(path) as data:
+        target = nx.Graph()
+        target.add_nodes_from(range(int(data["n"])))
+        edges = data["edges"].tolist()
+        if "weights" in data:
+            weights = data["weights"].tolist()
+            target.add_weighted_edges_from(
+                (u, v, w) for (u, v), w in zip(edges, weights))
+        else:
+            target.add_edges_from(edges)
+        pattern = target.subgraph(data["pattern"].tolist())
+    return target, pattern
+
+
+# Generates every instance of the sweep from its instance_seed, so a
+# corpus built with the same arguments is identical, and writes them to
+# `directory` along with a manifest describing each file.
+def build_corpus(directory, sizes, densities, ratios, iterations, seed,
+                 weighted=False):
+    os.makedirs(directory, exist_ok=True)
+    generate = generate_weighted_benchmark_pair if weighted \
+        else generate_benchmark_pair
+    instances = []
+    for size, density, ratio in product(sizes, densities, ratios):
+        for iteration in range(iterations):
+            s = instance_seed(seed, size, density, ratio, iteration)
+            target, pattern = generate(size, density, ratio, seed=s)
+            name = instance_name(size, density, ratio, iteration)
+            save_instance(os.path.join(directory, name), target, pattern,
+                          weighted)
+            instances.append({
+                "file": name,
+                "size": size,
+                "density": density,
+                "ratio": ratio,
+                "iteration": iteration,
+                "seed": s,
+                "target_edges": target.number_of_edges(),
+                "pattern_nodes": len(pattern),
+                "pattern_edges": pattern.number_of_edges(),
+            })
+    manifest = {"seed": seed, "weighted": weighted, "instances": instances}
+    with open(os.path.join(directory, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=1)
+    return Corpus(directory)
+
+
+class Corpus:
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST)) as f:
+            manifest = json.load(f)
+        self.seed = manifest["seed"]
+        self.weighted = manifest["weighted"]
+        self.instances = manifest["instances"]
+
+    def path(self, entry):
+        return os.path.join(self.directory, entry["file"])
+
+    def select(self, size=None, density=None, ratio=None):
+        return [
+            entry for entry in self.instances
+            if (size is None or entry["size"] == size)
+            and (density is None or entry["density"] == density)
+            and (ratio is None or entry["ratio"] == ratio)
+        ]
+
+    def pairs(self, size=None, density=None, ratio=None):
+        for entry in self.select(size, density, ratio):
+            yield load_instance(self.path(entry))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Write a corpus of benchmark instances to a directory.")
+    parser.add_argument("directory")
+    parser.add_argument("--sizes", nargs="+", required=True,
+                        help="target sizes, or start:stop:step ranges")
+    parser.add_argument("--densities", nargs="+", type=float, required=True)
+    parser.add_argument("--ratios", nargs="+", type=float, required=True)
+    parser.add_argument("--iterations", type=int, required=True)
+    parser.add_argument("--seed", type=int, required=True)
+    parser.add_argument("--weighted", action="store_true")
+    args = parser.parse_args(argv)
+    corpus = build_corpus(args.directory, parse_sizes(args.sizes),
+                          args.densities, args.ratios, args.iterations,
+                          args.seed, args.weighted)
+    print(f"{len(corpus.instances)} instances in {args.directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+from enum import Enum
+from itertools import chain
+import os
+
+import networkx as nx
+import numpy as np
+
+
+class Format(Enum):
+    LAD = 0
+    ARG = 1
+    EDGELIST = 2
+
+
+EXTENSIONS = {
+    ".lad": Format.LAD,
+    ".edges": Format.EDGELIST,
+    ".el": Format.EDGELIST,
+    ".txt": Format.EDGELIST,
+}
+
+
+# The matchers work on undirected graphs, so every loader symmetrises: an
+# arc listed in either or both directions becomes one edge. Nodes are the
+# integers used by the file (0 to n - 1 for LAD and ARG).
+def graph_from_edges(nodes, us, vs, weights=None):
+    G = nx.Graph()
+    G.add_nodes_from(nodes)
+    if weights is None:
+        G.add_edges_from(zip(us, vs))
+    else:
+        G.add_edges_from((u, v) if w is None else (u, v, {"weight": w})
+                         for u, v, w in zip(us, vs, weights))
+    return G
+
+
+# LAD and ARG both list, after the node count, each node's degree followed
+# by its neighbours; `words` holds the whole file as integers.
+def graph_from_adjacency_words(words):
+    n = int(words[0])
+    degrees = np.empty(n, dtype=np.int64)
+    starts = np.empty(n, dtype=np.int64)
+    pos = 1
+    for i in range(n):
+        degrees[i] = words[pos]
+        starts[i] = pos + 1
+        pos += degrees[i] + 1
+    us = np.repeat(np.arange(n), degrees)
+    offsets = np.arange(len(us)) \
+        - np.repeat(np.cumsum(degrees) - degrees, degrees)
+    vs = words[np.repeat(starts, degrees) + offsets]
+    return graph_from_edges(range(n), us.tolist(), vs.tolist())
+
+
+# LAD, as read by the LAD and Glasgow solvers: whitespace-separated text
+def read_lad(path):
+    with open(path, "rb") as f:
+        return graph_from_adjacency_words(
+            np.array(f.read().split(), dtype=np.int64))
+
+
+# Unlabelled ARG binary format of the VF/MIVIA graph database: the same
+# layout as LAD in little-endian 16-bit words
+def read_arg(path):
+    return graph_from_adjacency_words(
+        np.fromfile(path, dtype="<u2").astype(np.int64))
+
+
+# One edge per line, `u v` or `u v weight`; blank lines and lines starting
+# with # or % are skipped. Integer node names are read as integers.
+def read_edgelist(path):
+    us, vs, weights = [], [], []
+    weighted = False
+    with open(path) as f:
+        for line in f:
+            fields = line.split()
+            if not fields or fields[0][0] in "#%":
+                continue
+            us.append(fields[0])
+            vs.append(fields[1])
+            if len(fields) > 2:
+                weighted = True
+                weights.append(float(fields[2]))
+            else:
+                weights.append(None)
+    if all(name.lstrip("-").isdigit() for name in chain(us, vs)):
+        us = [int(u) for u in us]
+        vs = [int(v) for v in vs]
+    names = dict.fromkeys(chain.from_iterable(zip(us, vs)))
+    return graph_from_edges(names, us, vs, weights if weighted else None)
+
+
+READERS = {
+    Format.LAD: read_lad,
+    Format.ARG: read_arg,
+    Format.EDGELIST: read_edgelist,
+}
+
+
+# Without a format, it is guessed from the extension; files without a
+# known one are taken to be ARG, as the VF database names them *.A00 etc.
+def read_graph(path, format=None):
+    if format is None:
+        format = EXTENSIONS.get(os.path.splitext(path)[1].lower(),
+                                Format.ARG)
+    return READERS[format](path)
+
+
+# Benchmark suites ship the target and pattern as separate files.
+def read_pair(target_path, pattern_path, format=None):
+    return read_graph(target_path, format), read_graph(pattern_path, format)
+
+
+# A suite's instance list: one `name pattern target` line per instance,
+# with paths relative to the list's directory; blank lines and lines
+# starting with # are skipped. Returns (name, target path, pattern path)
+# triples, in the argument order of read_pair.
+def read_instance_list(path):
+    directory = os.path.dirname(path)
+    instances = []
+    with open(path) as f:
+        for line in f:
+            fields = line.split()
+            if not fields or fields[0].startswith("#"):
+                continue
+            name, pattern_path, target_path = fields
+            instances.append((name, os.path.join(directory, target_path),
+                              os.path.join(directory, pattern_path)))
+    return instances
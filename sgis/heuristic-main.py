@@ -1,10 +1,11 @@
-import networkx as nx
 import scipy
 
+from sgis.benchmark import bench, generate_weighted_benchmark_pair
+from sgis.corpus import Corpus
 from sgis.rolloutmatcher import GraphMatcher
 from sgis.util import geometric_mean
 
-import time
+import argparse
 import random
 import logging
 
@@ -12,31 +13,6 @@ logger = logging.getLogger(__name__)
 logging.basicConfig(filename="compare.log", level=logging.INFO)
 
 
-def bench(fn, *args, **kwargs):
-    init_time = time.time_ns()
-    result = fn(*args, **kwargs)
-    final_time = time.time_ns()
-    delta = final_time - init_time
-    logger.info(f"Benchmark for {str(fn)}: {delta} ns")
-    return result, delta
-
-
-def generate_weighted_benchmark_pair(
-    target_size, target_density, target_pattern_ratio_cap
-):
-    target = nx.binomial_graph(target_size, target_density)
-    for u, v in target.edges:
-        target[u][v]["weight"] = random.random()
-        #  d['weight'] = random.random()
-    n = len(target)
-    s = set(random.choices(range(n), k=int(n * target_pattern_ratio_cap)))
-    sub = target.subgraph(s)
-    largest_cc = max(nx.connected_components(sub), key=len)
-    pattern = target.subgraph(largest_cc)
-
-    return target, pattern
-
-
 # Stuff put in the document before the serious graphs (see below)
 def old_results():
     # C_5 is isompophic to the subgraph induced by the 'outer' vertices of the
@@ -62,7 +38,9 @@ def old_results():
 
 
 # About as horrible as it gets, really.
-def main():
+# With a corpus (sgis.corpus.Corpus) of weighted instances, each size runs
+# the corpus instances of that size instead of freshly generated ones.
+def main(corpus=None):
     random.seed(314159)
     # target sizes,
     # times (in ns), time standard deviations
@@ -85,8 +63,13 @@ def main():
         btimes = []
         rtimes = []
 
-        for j in range(NBENCH_ITER):
-            G, H = generate_weighted_benchmark_pair(N_NODES, P_EDGE, R_RATIO)
+        if corpus is None:
+            pairs = (generate_weighted_benchmark_pair(N_NODES, P_EDGE, R_RATIO)
+                     for _ in range(NBENCH_ITER))
+        else:
+            pairs = corpus.pairs(N_NODES, P_EDGE, R_RATIO)
+
+        for j, (G, H) in enumerate(pairs):
             GM = GraphMatcher(G, H)
             print(f"TEST {i}-{j}")
             print(f"\tTarget nodes: {G.number_of_nodes()}")
@@ -118,6 +101,9 @@ def main():
             print(f"\tbtime: {btime}")
             print(f"\trtime: {rtime}")
 
+        if not htimes:
+            continue
+
         htime = geometric_mean(htimes)
         btime = geometric_mean(btimes)
         rtime = geometric_mean(rtimes)
@@ -140,4 +126,15 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(
+        description="Compare the rollout matcher's weighted searches.")
+    parser.add_argument("--corpus",
+                        help="weighted corpus directory (see sgis.corpus) "
+                        "to run instead of generating instances")
+    args = parser.parse_args()
+    corpus = None
+    if args.corpus is not None:
+        corpus = Corpus(args.corpus)
+        if not corpus.weighted:
+            parser.error(f"{args.corpus} is not a weighted corpus")
+    main(corpus)
@@ -3,12 +3,19 @@ from networkx.generators import geometric
 import numpy as np
 import scipy
 
-from sgis.refinement import Heuristic, Refinement, level_dominates, outdegree_bfs
+from sgis.benchmark import (
+    bench,
+    generate_benchmark_pair,
+    test_combined_treematcher,
+    test_graphmatcher,
+)
+from sgis.corpus import Corpus
+from sgis.refinement import Refinement, level_dominates, outdegree_bfs
 from sgis.treematcher import TreeMatcher
 from sgis.util import geometric_mean, harmonic_mean
 from sgis.vf2 import GraphMatcher
 
-import time
+import argparse
 import random
 import math
 import logging
@@ -17,26 +24,6 @@ logger = logging.getLogger(__name__)
 logging.basicConfig(filename="compare.log", level=logging.INFO)
 
 
-def bench(fn, *args, **kwargs):
-    init_time = time.time_ns()
-    result = fn(*args, **kwargs)
-    final_time = time.time_ns()
-    delta = final_time - init_time
-    logger.info(f"Benchmark for {str(fn)}: {delta} ns")
-    return result, delta
-
-
-def generate_benchmark_pair(target_size, target_density, target_pattern_ratio_cap):
-    target = nx.binomial_graph(target_size, target_density)
-    n = len(target)
-    s = set(random.choices(range(n), k=int(n * target_pattern_ratio_cap)))
-    sub = target.subgraph(s)
-    largest_cc = max(nx.connected_components(sub), key=len)
-    pattern = target.subgraph(largest_cc)
-
-    return target, pattern
-
-
 def validate():
     random.seed(3141592)
 
@@ -50,45 +37,9 @@ def validate():
     print(GM.subgraph_is_isomorphic())
 
 
-def test_graphmatcher(G, H):
-    GM = GraphMatcher(G, H)
-    result, delta = bench(GM.subgraph_is_isomorphic)
-    expansions = GM.n_expanded_nodes()
-    logger.info(f"\t VF2 Expansions: {expansions}")
-    return result, expansions, delta
-
-
-def test_union_treematcher(G, H):
-    TM = TreeMatcher(G, H, heuristic=Heuristic.UNION)
-    result, delta = bench(TM.subgraph_is_isomorphic)
-    expansions = TM.n_expanded_nodes()
-    logger.info(f"\t Refinement (union) Expansions: {expansions}")
-    return result, expansions, delta
-
-
-def test_levels_treematcher(G, H):
-    TM = TreeMatcher(G, H, heuristic=Heuristic.LEVEL)
-    result, delta = bench(TM.subgraph_is_isomorphic)
-    expansions = TM.n_expanded_nodes()
-    logger.info(f"\t Refinement (levels) Expansions: {expansions}")
-    return result, expansions, delta
-
-
-def test_combined_treematcher(G, H):
-    TM = TreeMatcher(G, H, heuristic=Heuristic.LEVEL)
-    result, delta = bench(TM.subgraph_is_isomorphic)
-    expansions = TM.n_expanded_nodes()
-    logger.info(f"\t Refinement (levels) Expansions: {expansions}")
-    
-    if not result:
-        TM = TreeMatcher(G, H, heuristic=Heuristic.UNION)
-        result, delta = bench(TM.subgraph_is_isomorphic)
-        expansions += TM.n_expanded_nodes()
-        logger.info(f"\t Refinement (union) Expansions: {expansions}")
-    return result, expansions, delta
-
-
-def main():
+# With a corpus (sgis.corpus.Corpus), each size runs the corpus instances
+# of that size instead of freshly generated ones.
+def main(corpus=None):
     random.seed(314159)
     print("ntarget,vf2mean,vf2std,vf2time,refmean,refstd,reftime,accuracy")
     NBENCH_ITER = 100
@@ -103,10 +54,15 @@ def main():
         vf2_times = []
         tree_times = []
 
-        n_correct = NBENCH_ITER
+        n_correct = 0
+
+        if corpus is None:
+            pairs = (generate_benchmark_pair(N_NODES, P_EDGE, R_RATIO)
+                     for _ in range(NBENCH_ITER))
+        else:
+            pairs = corpus.pairs(N_NODES, P_EDGE, R_RATIO)
 
-        for j in range(NBENCH_ITER):
-            G, H = generate_benchmark_pair(N_NODES, P_EDGE, R_RATIO)
+        for G, H in pairs:
             logger.info(f"TEST {i}")
             logger.info(f"\tTarget nodes: {G.number_of_nodes()}")
             logger.info(f"\tTarget edges: {G.number_of_edges()}")
@@ -122,8 +78,11 @@ def main():
             vf2_times.append(gm_time)
             tree_times.append(tm_time)
 
-            if tm_result != gm_result:
-                n_correct -= 1
+            if tm_result == gm_result:
+                n_correct += 1
+
+        if not vf2_expansions:
+            continue
 
         gm_vf2 = geometric_mean(vf2_expansions)
         std_vf2 = scipy.stats.gstd(vf2_expansions)
@@ -133,7 +92,7 @@ def main():
         std_tree = scipy.stats.gstd(tree_expansions)
         time_tree = geometric_mean(tree_times)
 
-        accuracy = n_correct / NBENCH_ITER
+        accuracy = n_correct / len(vf2_expansions)
 
         print(
             f"{i},{gm_vf2},{std_vf2},{time_vf2},{gm_tree},{std_tree},{time_tree},{accuracy}"
@@ -218,5 +177,11 @@ def random_refinement_test(target_size, target_density, target_pattern_ratio_cap
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare VF2 with the combined TreeMatcher.")
+    parser.add_argument("--corpus",
+                        help="corpus directory (see sgis.corpus) to run "
+                        "instead of generating instances")
+    args = parser.parse_args()
     # random_refinement_test(30, 0.1, 0.75)
-    main()
+    main(None if args.corpus is None else Corpus(args.corpus))
@@ -0,0 +1,125 @@
+from collections import deque
+from enum import Enum
+import time
+
+
+class RuleOrder(Enum):
+    # The node class's RULES, as written
+    FIXED = 0
+    # Costs from the measured time per candidate
+    ADAPTIVE = 1
+    # Costs from the node class's RULE_COSTS; reproducible
+    DETERMINISTIC = 2
+
+
+# Every SAMPLE_INTERVAL-th candidate is profiled, the last PROFILE_SIZE
+# profiles are kept, and the order is revised every REORDER_INTERVAL
+# candidates (a multiple of SAMPLE_INTERVAL).
+SAMPLE_INTERVAL = 64
+PROFILE_SIZE = 256
+REORDER_INTERVAL = 1024
+
+
+# Static cost of each rule per candidate, from a node class's RULE_COSTS
+# of (constant, per neighbour) work and the graphs' mean degrees, as the
+# neighbour-scanning rules visit both nodes' neighbourhoods.
+def static_costs(rule_costs, target, pattern):
+    degree = sum(mean_degree(G) for G in (target, pattern))
+    return {rule: constant + per_neighbor * degree
+            for rule, (constant, per_neighbor) in rule_costs.items()}
+
+
+def mean_degree(G):
+    return 2 * G.number_of_edges() / len(G) if len(G) else 0.0
+
+
+# Runs a node class's feasibility rules in an order revised as the search
+# goes. The rules are filters of a conjunction, so the order changes what
+# a candidate costs but never whether it is feasible.
+#
+# Most candidates go through the current chain of rules, stopping at the
+# first that rejects. A profiled candidate runs every rule, each timed,
+# and its outcomes are kept. A reordering then builds the chain greedily:
+# each next rule is the one with the least cost / P(reject), its rejection
+# rate taken over the profiled candidates that pass every rule already
+# chosen, so rules that reject the same candidates are not both put
+# first. Rates are smoothed, (rejected + 1) / (profiled + 2), and ties
+# keep the RULES order.
+#
+# `rejected` counts, for each rule, the candidates it was the first to
+# reject in the order in force at the time.
+class RuleOrdering:
+    def __init__(self, node_class, mode, costs=None):
+        self.mode = mode
+        self.names = node_class.RULES
+        self.functions = [getattr(node_class, rule) for rule in self.names]
+        self.costs = None if costs is None \
+            else [costs[rule] for rule in self.names]
+        self.order = list(range(len(self.names)))
+        self.chain = list(enumerate(self.functions))
+        self.profile = deque(maxlen=PROFILE_SIZE)
+        self.rule_ns = [0] * len(self.names)
+        self.rejected = [0] * len(self.names)
+        self.profiled = 0
+        self.candidates = 0
+        self.reorderings = 0
+
+    @property
+    def rules(self):
+        return [self.names[i] for i in self.order]
+
+    def feasibility(self, node, target_node, pattern_node):
+        self.candidates += 1
+        if self.candidates % SAMPLE_INTERVAL == 0:
+            return self.profile_candidate(node, target_node, pattern_node)
+        for i, rule in self.chain:
+            if not rule(node, target_node, pattern_node):
+                self.rejected[i] += 1
+                return False
+        return True
+
+    def profile_candidate(self, node, target_node, pattern_node):
+        clock = time.perf_counter_ns
+        outcome = []
+        for i, rule in enumerate(self.functions):
+            start = clock()
+            outcome.append(rule(node, target_node, pattern_node))
+            self.rule_ns[i] += clock() - start
+        self.profile.append(outcome)
+        self.profiled += 1
+        for i in self.order:
+            if not outcome[i]:
+                self.rejected[i] += 1
+                break
+        if self.candidates % REORDER_INTERVAL == 0:
+            self.reorder()
+        return all(outcome)
+
+    def reorder(self):
+        if self.mode is RuleOrder.ADAPTIVE:
+            costs = [ns / self.profiled for ns in self.rule_ns]
+        else:
+            costs = self.costs
+        samples = list(self.profile)
+        remaining = list(range(len(self.names)))
+        order = []
+        while remaining:
+            ranks = [costs[i] * (len(samples) + 2)
+                     / (sum(not outcome[i] for outcome in samples) + 1)
+                     for i in remaining]
+            best = remaining.pop(ranks.index(min(ranks)))
+            order.append(best)
+            samples = [outcome for outcome in samples if outcome[best]]
+        self.order = order
+        self.chain = [(i, self.functions[i]) for i in order]
+        self.reorderings += 1
+
+    def as_dict(self):
+        return {
+            "mode": self.mode.name.lower(),
+            "rules": self.rules,
+            "rejected": dict(zip(self.names, self.rejected)),
+            "candidates": self.candidates,
+            "profiled": self.profiled,
+            "reorderings": self.reorderings,
+        }
@@ -0,0 +1,125 @@
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable
+import logging
+import multiprocessing as mp
+import queue
+import time
+
+from sgis.refinement import Heuristic
+from sgis.treematcher import TreeMatcher
+from sgis.vf2 import GraphMatcher
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks on workers that may have died without answering
+POLL_INTERVAL = 0.1
+
+
+def run_vf2(target, pattern):
+    GM = GraphMatcher(target, pattern)
+    return GM.subgraph_is_isomorphic(), GM.n_expanded_nodes()
+
+
+def run_level_treematcher(target, pattern):
+    TM = TreeMatcher(target, pattern, heuristic=Heuristic.LEVEL)
+    return TM.subgraph_is_isomorphic(), TM.n_expanded_nodes()
+
+
+def run_union_treematcher(target, pattern):
+    TM = TreeMatcher(target, pattern, heuristic=Heuristic.UNION)
+    return TM.subgraph_is_isomorphic(), TM.n_expanded_nodes()
+
+
+# `fn(target, pattern)` must be a module-level function returning
+# (result, expansions) so it can be shipped to a worker process. Every
+# engine's True is checked against the graphs by the search itself, but a
+# False is only trusted from engines whose pruning is `exact`; the level
+# heuristic is known to reject feasible pairs (see the accuracy column of
+# the LP figures).
+@dataclass(frozen=True)
+class Engine:
+    name: str
+    fn: Callable
+    exact: bool = True
+
+
+DEFAULT_ENGINES = (
+    Engine("vf2", run_vf2),
+    Engine("level", run_level_treematcher, exact=False),
+    Engine("union", run_union_treematcher),
+)
+
+
+def _run_engine(engine, target, pattern, results):
+    try:
+        result, expansions = engine.fn(target, pattern)
+    except Exception as e:
+        logger.warning(f"Engine {engine.name} failed: {e!r}")
+        result, expansions = None, None
+    results.put((engine.name, result, expansions))
+
+
+class Portfolio:
+    def __init__(self, engines=DEFAULT_ENGINES):
+        self.engines = {engine.name: engine for engine in engines}
+        self.wins = Counter()
+
+    def is_definitive(self, name, result):
+        if result is None:
+            return False
+        return result or self.engines[name].exact
+
+    # `timeout` bounds the whole call. A worker that exits without posting
+    # (killed, or crashed in the interpreter) counts as having no answer.
+    def subgraph_is_isomorphic(self, target, pattern, timeout=None):
+        results = mp.Queue()
+        workers = {
+            engine.name: mp.Process(target=_run_engine,
+                                    args=(engine, target, pattern, results),
+                                    daemon=True)
+            for engine in self.engines.values()
+        }
+        for w in workers.values():
+            w.start()
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        answer = None
+        fallback = None
+        pending = set(workers)
+        try:
+            while pending:
+                wait = POLL_INTERVAL
+                if deadline is not None:
+                    wait = min(wait, deadline - time.monotonic())
+                    if wait <= 0:
+                        break
+                try:
+                    name, result, expansions = results.get(timeout=wait)
+                except queue.Empty:
+                    for name in list(pending):
+                        exitcode = workers[name].exitcode
+                        if exitcode is not None and exitcode != 0:
+                            logger.warning(f"Engine {name} died with exit "
+                                           f"code {exitcode}")
+                            pending.discard(name)
+                    continue
+                pending.discard(name)
+                logger.info(f"\t{name}: {result} ({expansions} expansions)")
+                if self.is_definitive(name, result):
+                    self.wins[name] += 1
+                    logger.info(f"Portfolio winner: {name}")
+                    answer = result
+                    break
+                if fallback is None and result is not None:
+                    fallback = result
+        finally:
+            for w in workers.values():
+                if w.is_alive():
+                    w.terminate()
+                w.join()
+
+        # Only inexact engines answered; their negative is the best we have.
+        if answer is None:
+            answer = fallback
+        return answer
@@ -0,0 +1,132 @@
+from array import array
+from enum import Enum
+import json
+import struct
+
+from sgis.trace import Tracer
+
+# parent index, target id, pattern id, cost
+RECORD = struct.Struct("<qqqd")
+
+
+class Format(Enum):
+    BINARY = 0
+    JSONL = 1
+
+
+# Search tree kept as parallel arrays indexed by the order nodes were
+# recorded in; the root is recorded as index 0 with parent -1 and pair
+# ids -1. Node labels are interned, so the arrays hold only integers.
+# With a `stream`, each node is also written out as it is recorded:
+# BINARY writes RECORD structs that refer to the interned ids (see
+# dump_labels), JSONL writes one object per node with the labels inline.
+# `keep=False` streams without holding the tree in memory.
+#
+# As a tracer, every pushed node is recorded, so any rolloutmatcher search
+# can be captured. Only rolloutmatcher nodes link to their parents; the
+# vf2 and treematcher searches mutate a single node in place, so they
+# cannot be recorded and are rejected with a TypeError.
+class SearchTreeRecorder(Tracer):
+    def __init__(self, stream=None, format=Format.BINARY, keep=True):
+        self.stream = stream
+        self.format = format
+        self.keep = keep
+
+        self.parents = array("q")
+        self.targets = array("q")
+        self.patterns = array("q")
+        self.costs = array("d")
+        self.n_nodes = 0
+
+        self.target_labels = []
+        self.pattern_labels = []
+        self._target_ids = {}
+        self._pattern_ids = {}
+
+    def __len__(self):
+        return self.n_nodes
+
+    def intern(self, label, labels, ids):
+        if label not in ids:
+            ids[label] = len(labels)
+            labels.append(label)
+        return ids[label]
+
+    def push(self, node):
+        self.record(node)
+
+    def record(self, node):
+        # Nodes remember their index per recorder, so the root of a matcher
+        # can be recorded by several recorders in turn.
+        recorded = getattr(node, "recorded", None)
+        if recorded is not None and recorded[0] is self:
+            return recorded[1]
+        if not hasattr(node, "parent"):
+            raise TypeError(
+                f"{type(node).__module__}.{type(node).__qualname__} has no "
+                f"parent link; only rolloutmatcher searches can be recorded")
+
+        if node.parent is None:
+            parent, target, pattern = -1, -1, -1
+        else:
+            parent = self.record(node.parent)
+            target = self.intern(
+                node.target_node, self.target_labels, self._target_ids)
+            pattern = self.intern(
+                node.pattern_node, self.pattern_labels, self._pattern_ids)
+
+        index = self.n_nodes
+        self.n_nodes += 1
+        node.recorded = (self, index)
+
+        if self.keep:
+            self.parents.append(parent)
+            self.targets.append(target)
+            self.patterns.append(pattern)
+            self.costs.append(node.cost)
+
+        if self.stream is not None:
+            if self.format == Format.BINARY:
+                self.stream.write(
+                    RECORD.pack(parent, target, pattern, node.cost))
+            else:
+                self.stream.write(json.dumps({
+                    "id": index,
+                    "parent": parent,
+                    "target": node.target_node,
+                    "pattern": node.pattern_node,
+                    "cost": node.cost,
+                }, default=str) + "\n")
+        return index
+
+    def dump_labels(self, file):
+        json.dump({"target": self.target_labels,
+                   "pattern": self.pattern_labels}, file, default=str)
+
+    def assignments(self, index):
+        pairs = []
+        while self.parents[index] != -1:
+            pairs.append((self.target_labels[self.targets[index]],
+                          self.pattern_labels[self.patterns[index]]))
+            index = self.parents[index]
+        pairs.reverse()
+        return pairs
+
+    # Nodes are labelled with their full assignment, one pair per line,
+    # and edges with the child's cost. Meant for small trees.
+    def write_dot(self, path):
+        with open(path, "w") as f:
+            f.write("strict digraph {\n")
+            for i in range(self.n_nodes):
+                label = "".join(f"({t}, {p})\\n"
+                                for t, p in self.assignments(i)) or "{}"
+                f.write(f"{i} [label=\"{label}\"];\n")
+            for i in range(1, self.n_nodes):
+                f.write(f"{self.parents[i]} -> {i} "
+                        f"[label={self.costs[i]}, weight={self.costs[i]}];\n")
+            f.write("}\n")
+
+
+def read_records(stream):
+    while chunk := stream.read(RECORD.size):
+        yield RECORD.unpack(chunk)
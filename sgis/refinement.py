@@ -14,6 +14,15 @@ class Heuristic(Enum):
     LEVEL = 1
 
 
+# How the verdicts of several heuristics are folded into one table entry.
+# ALL keeps a pair only if every heuristic admits it; ANY keeps it if some
+# heuristic does, which is the single-search form of trying a stricter
+# heuristic and falling back to a looser one.
+class Combine(Enum):
+    ALL = 0
+    ANY = 1
+
+
 def partition_dict_by_keys(G, d):
     partition = defaultdict(list)
     for k, v in d.items():
@@ -134,36 +143,76 @@ def path_bfs(G, v):
 
 
 class Refinement:
-    def __init__(self, target, pattern, heuristic=Heuristic.UNION):
+    def __init__(self, target, pattern, heuristic=Heuristic.UNION,
+                 combine=Combine.ALL):
         self.target = target
         self.pattern = pattern
+        if isinstance(heuristic, Heuristic):
+            self.heuristics = (heuristic,)
+        else:
+            self.heuristics = tuple(heuristic)
+        self.combine = all if combine == Combine.ALL else any
         self.refinement = defaultdict(dict)
-        match heuristic:
-            case Heuristic.UNION:
-                self.union_refinement()
-            case Heuristic.LEVEL:
-                self.level_refinement()
+        self.pattern_levels = {
+            p: outdegree_bfs(self.pattern, p) for p in self.pattern.nodes()
+        }
+        self.refine()
 
     def query(self, target_node, pattern_node):
         return self.refinement[target_node][pattern_node]
 
-    def union_refinement(self):
-        for t in self.target.nodes():
-            t_part = degree_bfs(self.target, t)
-            for p in self.pattern.nodes():
-                p_part = outdegree_bfs(self.pattern, p)
-                self.refinement[t][p] = union_level_dominates(
-                    t_part, p_part, REFINEMENT_TRUNCATION
+    def dominates(self, heuristic, target_level, pattern_level):
+        match heuristic:
+            case Heuristic.UNION:
+                return union_level_dominates(
+                    target_level, pattern_level, REFINEMENT_TRUNCATION
+                )
+            case Heuristic.LEVEL:
+                return level_dominates(
+                    target_level, pattern_level, REFINEMENT_TRUNCATION
                 )
 
-    def level_refinement(self):
+    # Every heuristic compares the same pair of BFS profiles, so each node
+    # is traversed once no matter how many heuristics are combined.
+    def refine_target_node(self, t):
+        t_part = degree_bfs(self.target, t)
+        row = self.refinement[t]
+        for p, p_part in self.pattern_levels.items():
+            row[p] = self.admits(t_part, p_part)
+
+    def admits(self, target_level, pattern_level):
+        return self.combine(
+            self.dominates(h, target_level, pattern_level)
+            for h in self.heuristics
+        )
+
+    def refine(self):
         for t in self.target.nodes():
-            t_part = degree_bfs(self.target, t)
-            for p in self.pattern.nodes():
-                p_part = outdegree_bfs(self.pattern, p)
-                self.refinement[t][p] = level_dominates(
-                    t_part, p_part, REFINEMENT_TRUNCATION
-                )
+            self.refine_target_node(t)
+
+    # Only the first REFINEMENT_TRUNCATION + 1 levels of a profile are
+    # compared, so a change to edge (u, v) is invisible to any target node
+    # further than that from both endpoints.
+    def affected_target_nodes(self, u, v):
+        affected = set()
+        for n in (u, v):
+            if n in self.target:
+                affected.update(nx.single_source_shortest_path_length(
+                    self.target, n, cutoff=REFINEMENT_TRUNCATION))
+        return affected
+
+    def add_edge(self, u, v, **attr):
+        self.target.add_edge(u, v, **attr)
+        for t in self.affected_target_nodes(u, v):
+            self.refine_target_node(t)
+
+    def remove_edge(self, u, v):
+        # Distances only grow on deletion, so collect the rows to refresh
+        # while the edge is still there.
+        affected = self.affected_target_nodes(u, v)
+        self.target.remove_edge(u, v)
+        for t in affected:
+            self.refine_target_node(t)
 
     def distance_refinement(self):
         apsp_t = nx.floyd_warshall(self.target)
@@ -181,3 +230,41 @@ class Refinement:
             for p, b in td.items():
                 print(f"({t} {p}): {b}", end="\t")
             print()
+
+
+# Fills in table entries the first time the search asks for them, so pairs
+# the search never reaches cost nothing.
+class LazyRefinement(Refinement):
+    def refine(self):
+        self.target_levels = {}
+
+    def query(self, target_node, pattern_node):
+        row = self.refinement[target_node]
+        if pattern_node not in row:
+            if target_node not in self.target_levels:
+                self.target_levels[target_node] = \
+                    degree_bfs(self.target, target_node)
+            row[pattern_node] = self.admits(
+                self.target_levels[target_node],
+                self.pattern_levels[pattern_node])
+        return row[pattern_node]
+
+    def refine_target_node(self, t):
+        self.refinement.pop(t, None)
+        self.target_levels.pop(t, None)
+
+
+# Admits every pair; used when refinement is not worth building.
+class TrivialRefinement:
+    def __init__(self, target, pattern):
+        self.target = target
+        self.pattern = pattern
+
+    def query(self, target_node, pattern_node):
+        return True
+
+    def add_edge(self, u, v, **attr):
+        self.target.add_edge(u, v, **attr)
+
+    def remove_edge(self, u, v):
+        self.target.remove_edge(u, v)
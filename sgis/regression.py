@@ -0,0 +1,206 @@
+from itertools import product
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+
+import networkx as nx
+
+from sgis.benchmark import (
+    ENGINES,
+    WEIGHTED_ENGINES,
+    generate_benchmark_pair,
+    generate_weighted_benchmark_pair,
+    instance_seed,
+    measure,
+)
+from sgis.corpus import instance_name
+from sgis.util import geometric_mean
+
+BASELINE = "benchmarks/baseline.json"
+
+# Fixed instance sets, regenerated from their seeds on every run; each
+# baseline entry keeps the instance's edge counts so a change in the
+# generator shows up as a changed instance rather than as a regression.
+SUITE = {"sizes": (30, 35, 40), "density": 0.10, "ratio": 0.75,
+         "iterations": 4, "seed": 1}
+WEIGHTED_SUITE = {"sizes": (14, 18, 22), "density": 0.25, "ratio": 0.40,
+                  "iterations": 3, "seed": 1}
+
+# Engines whose answers must agree with vf2; the level heuristic is known
+# to reject feasible pairs (see portfolio.DEFAULT_ENGINES).
+EXACT_ENGINES = ("vf2", "union", "combined", "vf2-adaptive",
+                 "union-adaptive")
+# Weighted engines whose cost must not change at all
+OPTIMAL_ENGINES = ("best",)
+
+# Slowdown of an engine's geometric mean time over the suite that fails
+TIME_THRESHOLD = 1.25
+TIME_REPEATS = 3
+TIME_WARMUP = 1
+
+
+def suite_instances():
+    for weighted, suite in ((False, SUITE), (True, WEIGHTED_SUITE)):
+        generate = generate_weighted_benchmark_pair if weighted \
+            else generate_benchmark_pair
+        for size, iteration in product(suite["sizes"],
+                                       range(suite["iterations"])):
+            density, ratio = suite["density"], suite["ratio"]
+            seed = instance_seed(suite["seed"], size, density, ratio,
+                                 iteration)
+            target, pattern = generate(size, density, ratio, seed=seed)
+            name = instance_name(size, density, ratio, iteration)
+            yield weighted, os.path.splitext(name)[0], target, pattern
+
+
+def run_suite(repeats, warmup):
+    instances = []
+    for weighted, name, target, pattern in suite_instances():
+        registry = WEIGHTED_ENGINES if weighted else ENGINES
+        engines = {}
+        for engine, spec in registry.items():
+            m = measure(spec, target, pattern, repeats=repeats,
+                        warmup=warmup)
+            engines[engine] = {
+                "result": m.result,
+                "expansions": m.expansions,
+                "time_ns": m.construct_ns + m.search_ns,
+            }
+        instances.append({
+            "name": name,
+            "weighted": weighted,
+            "target_edges": target.number_of_edges(),
+            "pattern_nodes": len(pattern),
+            "pattern_edges": pattern.number_of_edges(),
+            "engines": engines,
+        })
+        print(f"{name}: " + ", ".join(
+            f"{engine} {run['expansions'] or run['result']}"
+            for engine, run in engines.items()), file=sys.stderr)
+    return instances
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "networkx": nx.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+    }
+
+
+def record(path, repeats, warmup):
+    baseline = {"environment": environment(),
+                "instances": run_suite(repeats, warmup)}
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=1)
+        f.write("\n")
+    print(f"Recorded {len(baseline['instances'])} instances to {path}")
+
+
+# Returns the failures found comparing `current` runs with `baseline`.
+# Expansions and results are deterministic and compared per instance;
+# times are compared per engine as the geometric mean of the per-instance
+# ratios, which is what survives the noise of single timings.
+def compare(baseline, current, time_threshold):
+    failures = []
+    ratios = {}
+    by_name = {instance["name"]: instance for instance in baseline}
+    for instance in current:
+        name = instance["name"]
+        old = by_name.get(name)
+        if old is None:
+            failures.append(f"{name}: not in the baseline")
+            continue
+        shape = ("target_edges", "pattern_nodes", "pattern_edges")
+        if any(old[key] != instance[key] for key in shape):
+            failures.append(f"{name}: instance changed; re-record")
+            continue
+
+        runs = instance["engines"]
+        for engine, run in runs.items():
+            was = old["engines"].get(engine)
+            if was is None:
+                continue
+            if instance["weighted"]:
+                failures.extend(compare_cost(name, engine, was, run))
+            elif run["result"] != was["result"]:
+                failures.append(f"{name}: {engine} answered {run['result']}"
+                                f", baseline {was['result']}")
+            if run["expansions"] is not None and \
+                    run["expansions"] > was["expansions"]:
+                failures.append(f"{name}: {engine} expanded "
+                                f"{run['expansions']} nodes, baseline "
+                                f"{was['expansions']}")
+            ratios.setdefault(engine, []).append(
+                run["time_ns"] / was["time_ns"])
+
+        if not instance["weighted"]:
+            answers = {engine: runs[engine]["result"]
+                       for engine in EXACT_ENGINES if engine in runs}
+            if len(set(answers.values())) > 1:
+                failures.append(f"{name}: exact engines disagree: {answers}")
+
+    if time_threshold is not None:
+        for engine, engine_ratios in ratios.items():
+            slowdown = geometric_mean(engine_ratios)
+            print(f"{engine}: {slowdown:.3f}x baseline time")
+            if slowdown > time_threshold:
+                failures.append(f"{engine}: {slowdown:.2f}x slower than "
+                                f"baseline (threshold {time_threshold})")
+    return failures
+
+
+def compare_cost(name, engine, was, run):
+    cost, baseline_cost = run["result"], was["result"]
+    if engine in OPTIMAL_ENGINES:
+        if not math.isclose(cost, baseline_cost, rel_tol=1e-9):
+            return [f"{name}: {engine} found cost {cost}, "
+                    f"baseline {baseline_cost}"]
+    elif cost > baseline_cost * (1 + 1e-9):
+        return [f"{name}: {engine} cost rose to {cost} from "
+                f"{baseline_cost}"]
+    return []
+
+
+def check(path, repeats, warmup, time_threshold):
+    with open(path) as f:
+        baseline = json.load(f)
+    if time_threshold is not None and \
+            baseline["environment"] != environment():
+        print(f"Baseline recorded on {baseline['environment']}; times may "
+              f"not be comparable", file=sys.stderr)
+    current = run_suite(repeats, warmup)
+    failures = compare(baseline["instances"], current, time_threshold)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print(f"{len(failures)} failures over {len(current)} instances")
+    return not failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Record or check the performance regression baseline.")
+    parser.add_argument("command", choices=("record", "check"))
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--repeats", type=int, default=TIME_REPEATS)
+    parser.add_argument("--warmup", type=int, default=TIME_WARMUP)
+    parser.add_argument("--time-threshold", type=float,
+                        default=TIME_THRESHOLD)
+    parser.add_argument("--no-timing", action="store_true",
+                        help="check expansions and results only")
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        record(args.baseline, args.repeats, args.warmup)
+        return
+    threshold = None if args.no_timing else args.time_threshold
+    if not check(args.baseline, args.repeats, args.warmup, threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
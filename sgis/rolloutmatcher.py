@@ -1,64 +1,163 @@
+from bisect import insort
+from collections import deque
+from enum import Enum
+from itertools import accumulate
+from operator import itemgetter
+import heapq
+import math
+import multiprocessing as mp
+import time
 import networkx as nx
-from copy import deepcopy
-from sgis.util import PriorityQueue
+import numpy as np
+from sgis.recorder import SearchTreeRecorder
+from sgis.trace import TracedPriorityQueue, traced_feasibility
+from sgis.util import ExternalPriorityQueue, LRUCache, PriorityQueue
+
+# Entries kept in each matcher's rollout transposition table
+ROLLOUT_CACHE_SIZE = 100000
+# States kept per depth by beam_isomorphism
+BEAM_WIDTH = 32
+# Exploration constant of the UCT rule in mcts_isomorphism
+UCT_EXPLORATION = 1.4
+
+
+# Raised by a search given a deadline once the deadline has passed
+class SearchTimeout(Exception):
+    pass
+
+
+class Rank(Enum):
+    COST = 0
+    ROLLOUT = 1
 
 
 class GraphMatcher:
-    def __init__(self, target, pattern):
+    # With `frontier_capacity`, search queues keep at most that many nodes
+    # in memory and spill the rest to disk as assignment lists, which are
+    # replayed from the root when popped. Replayed nodes are new objects,
+    # so a recorder sees their ancestors again as new nodes.
+    def __init__(self, target, pattern, cache_size=ROLLOUT_CACHE_SIZE,
+                 tracer=None, frontier_capacity=None):
         self.target = target
         self.pattern = pattern
+        self.tracer = tracer
+        self.frontier_capacity = frontier_capacity
+        self.node_class = TreeNode if tracer is None else TracedTreeNode
 
         self.target_nodes = set(target.nodes())
         self.pattern_nodes = set(pattern.nodes())
 
         self.pattern_node_order = {n: i for i, n in enumerate(pattern)}
 
-        self.root_node = TreeNode(self)
+        # Plain lookup tables for remaining_cost_bound: cheapest_weights[k]
+        # is the total of the k lightest target edges, and each target
+        # node's incident edges are listed lightest first.
+        self.cheapest_weights = list(accumulate(
+            sorted(w for _, _, w in target.edges(data='weight')),
+            initial=0))
+        self.incident_weights = {
+            t: sorted(((data['weight'], n) for n, data in target[t].items()),
+                      key=itemgetter(0))
+            for t in target
+        }
+        self.pattern_neighbors = {p: tuple(pattern[p]) for p in pattern}
+        self.n_pattern_edges = pattern.number_of_edges()
+
+        # Target adjacency compiled to CSR arrays: the neighbours of the
+        # node with index i are indices[indptr[i]:indptr[i + 1]], with the
+        # edge weights at the same positions in `weights`.
+        self.target_index = {n: i for i, n in enumerate(target)}
+        self.neighbor_weights = {
+            t: tuple((n, data['weight']) for n, data in target[t].items())
+            for t in target
+        }
+        degrees = [len(self.neighbor_weights[t]) for t in target]
+        self.indptr = np.concatenate(([0], np.cumsum(degrees)))
+        self.indices = np.array(
+            [self.target_index[n]
+             for t in target for n, _ in self.neighbor_weights[t]],
+            dtype=np.intp)
+        self.weights = np.array(
+            [w for t in target for _, w in self.neighbor_weights[t]],
+            dtype=float)
+        # Scratch mask of the assigned target nodes for generate_costs,
+        # which sets and clears only the entries it needs.
+        self.assigned = np.zeros(len(target), dtype=bool)
+
+        self.rollout_cache = LRUCache(cache_size)
+
+        self.root_node = self.node_class(self)
 
     def subgraph_is_isomorphic(self):
         return self.match()
 
+    def new_queue(self, traced=True):
+        if self.frontier_capacity is None:
+            queue = PriorityQueue()
+        else:
+            queue = ExternalPriorityQueue(
+                self.frontier_capacity, self.encode, self.decode)
+        if self.tracer is None or not traced:
+            return queue
+        return TracedPriorityQueue(self.tracer, queue)
+
+    # Frontier entries on disk: a node is its assignments, a cursor its
+    # parent's assignments followed by its own fields.
+    def encode(self, item):
+        if isinstance(item, Cursor):
+            return (item.parent.assignments(), item.pairs, item.serial,
+                    item.index)
+        return (item.assignments(),)
+
+    def decode(self, encoded):
+        node = self.replay(encoded[0])
+        if len(encoded) == 1:
+            return node
+        return Cursor(node, *encoded[1:])
+
     def match(self):
-        search_queue = PriorityQueue()
+        search_queue = self.new_queue()
         search_queue.push(self.root_node, -self.root_node.depth)
         while not search_queue.empty():
             node = search_queue.pop()
-            node.debug_print()
             if node.is_isomorphism():
+                self.solution(node)
                 return True
             child_nodes = node.generate_children()
             for child in child_nodes:
                 search_queue.push(child, -child.depth)
         return False
 
-    def isomorphism_search_tree(self):
-        partial_isomorphism_tree = nx.DiGraph()
+    # Exhaustive search that records every generated node in `recorder`.
+    def isomorphism_search_tree(self, recorder=None):
+        if recorder is None:
+            recorder = SearchTreeRecorder()
+        recorder.record(self.root_node)
         isomorphisms = []
-        search_queue = PriorityQueue()
+        search_queue = self.new_queue()
         search_queue.push(self.root_node, -self.root_node.depth)
         while not search_queue.empty():
             node = search_queue.pop()
             if node.is_isomorphism():
+                self.solution(node)
                 isomorphisms.append(node)
                 continue
             child_nodes = node.generate_children()
             for child in child_nodes:
                 search_queue.push(child, -child.depth)
-                partial_isomorphism_tree.add_edge(
-                    child.parent.get_hashable_state(),
-                    child.get_hashable_state(),
-                    weight=child.cost)
-        return isomorphisms, partial_isomorphism_tree
+                recorder.record(child)
+        return isomorphisms, recorder
 
     # Naive method
-    def best_isomorphism(self):
+    def exhaustive_best_isomorphism(self):
         isomorphisms = []
-        search_queue = PriorityQueue()
+        search_queue = self.new_queue()
         search_queue.push(self.root_node, -self.root_node.depth)
 
         while not search_queue.empty():
             node = search_queue.pop()
             if node.is_isomorphism():
+                self.solution(node)
                 isomorphisms.append(node)
                 continue
             child_nodes = node.generate_children()
@@ -70,57 +169,443 @@ class GraphMatcher:
         best = min(isomorphisms, key=lambda x: x.cost)
         return best.cost, best.target_to_pattern_map
 
-    # Greedy search
-    def heuristic_isomorphism(self):
-        search_queue = PriorityQueue()
+    # Branch and bound: dive towards cheap children for an early incumbent,
+    # then discard every node whose cost plus an admissible bound on the
+    # weight still to come cannot beat it.
+    def best_isomorphism(self):
+        best = self.top_k_isomorphisms(1)
+        if not best:
+            return None
+        return best[0]
+
+    # The k cheapest embeddings, cheapest first. `kept` is a max-heap of the
+    # best k found so far; once it is full, its worst cost is the incumbent
+    # the branch and bound prunes against.
+    def top_k_isomorphisms(self, k):
+        kept = []
+        if k < 1:
+            return kept
+        found = 0
+        search_queue = self.new_queue()
         search_queue.push(
             self.root_node, (-self.root_node.depth, self.root_node.cost))
 
         while not search_queue.empty():
             node = search_queue.pop()
+            if len(kept) == k and \
+                    node.cost + node.remaining_cost_bound() >= -kept[0][0]:
+                if self.tracer is not None:
+                    self.tracer.prune(node, None, None, "bound")
+                continue
             if node.is_isomorphism():
-                return node.cost, node.target_to_pattern_map
+                self.solution(node)
+                entry = (-node.cost, -found, node)
+                found += 1
+                if len(kept) == k:
+                    heapq.heapreplace(kept, entry)
+                else:
+                    heapq.heappush(kept, entry)
+                continue
             child_nodes = node.generate_children()
             for child in child_nodes:
-                search_queue.push(child, (-child.depth, child.cost))
-        return None
+                if len(kept) < k or child.cost < -kept[0][0]:
+                    search_queue.push(child, (-child.depth, child.cost))
+
+        return [(node.cost, node.target_to_pattern_map)
+                for _, _, node in sorted(kept, reverse=True)]
+
+    # Greedy search
+    def heuristic_isomorphism(self):
+        node = self.lazy_best_first(self.root_node)
+        if node is None:
+            return None
+        return node.cost, node.target_to_pattern_map
+
+    # Depth-first, cheapest-child-first search from `start` that builds
+    # children only when they are reached. An expanded node is queued once
+    # as a cursor onto its ranked pairs; popping it builds the current
+    # child and re-queues the cursor at the next pair. The expansion serial
+    # and pair index in the priority reproduce the push-order tie-breaking
+    # of queueing every child up front, so nodes are reached in the same
+    # order. Returns the first isomorphism, or None. Only the nodes on the
+    # path to the current one stay alive; with `expanded`, a collection
+    # such as a bounded deque, the canonical key of every expanded node is
+    # appended to it. With a `deadline` (a time.monotonic() value), raises
+    # SearchTimeout once it passes.
+    def lazy_best_first(self, start, deadline=None, expanded=None):
+        search_queue = self.new_queue(traced=False)
+        serial = 0
+        node = start
+        while True:
+            if deadline is not None and time.monotonic() >= deadline:
+                raise SearchTimeout
+            if self.tracer is not None:
+                self.tracer.push(node)
+                self.tracer.pop(node)
+            if node.is_isomorphism():
+                self.solution(node)
+                return node
+            serial += 1
+            if expanded is not None:
+                expanded.append(node.canonical_key())
+
+            pairs = node.ranked_pairs()
+            if pairs:
+                cursor = Cursor(node, pairs, serial)
+                search_queue.push(cursor, cursor.priority())
+            if search_queue.empty():
+                return None
+
+            cursor = search_queue.pop()
+            node = cursor.child()
+            cursor.index += 1
+            if cursor.index < len(cursor.pairs):
+                search_queue.push(cursor, cursor.priority())
 
     # Ours!
-    def rollout_isomorphism(self):
-        search_queue = PriorityQueue()
+    # With `processes`, the rollouts of each expanded node's children run
+    # concurrently in a pool whose workers hold their own copy of the graphs.
+    def rollout_isomorphism(self, processes=None):
+        if processes is None:
+            return self._rollout_isomorphism(
+                lambda children: [child.rollout() for child in children])
+
+        with mp.Pool(processes, initializer=_init_rollout_worker,
+                     initargs=(self.target, self.pattern,
+                               self.rollout_cache.maxsize)) as pool:
+            return self._rollout_isomorphism(
+                lambda children: self.parallel_rollouts(pool, children))
+
+    def _rollout_isomorphism(self, rollouts):
+        search_queue = self.new_queue()
         search_queue.push(
             self.root_node, (-self.root_node.depth, self.root_node.cost))
 
         while not search_queue.empty():
             node = search_queue.pop()
             if node.is_isomorphism():
+                self.solution(node)
                 return node.cost, node.target_to_pattern_map
-            child_nodes = node.generate_children()
-            for child in child_nodes:
-                search_queue.push(child, (-child.depth, child.rollout()))
+            child_nodes = list(node.generate_children())
+            for child, value in zip(child_nodes, rollouts(child_nodes)):
+                search_queue.push(child, (-child.depth, value))
         return None
 
-
+    # Only the assignments leading to each uncached child are shipped; the
+    # completions that come back are added to this matcher's cache.
+    def parallel_rollouts(self, pool, children):
+        results = [self.rollout_cache.get(child.canonical_key())
+                   for child in children]
+        pending = [i for i, result in enumerate(results) if result is None]
+        completions = pool.map(
+            _rollout_worker, [children[i].assignments() for i in pending])
+        for i, result in zip(pending, completions):
+            self.rollout_cache.put(children[i].canonical_key(), result)
+            results[i] = result
+        return [cost for cost, _ in results]
+
+    # Beam search: only the `width` best states of each depth survive,
+    # ranked by cost so far or by rollout value. Ranking by rollout also
+    # keeps the cheapest completion any rollout found, which is returned
+    # if it beats the beam. Memory is bounded by the width, so a beam that
+    # had to cut states and died out returns None although an embedding
+    # may exist. With `adaptive`, such a beam is retried at twice the width
+    # until no depth had to be cut, at which point the search was
+    # exhaustive. With `fallback`, it instead falls back to the greedy
+    # completion of the root, which backtracks fully and is not bounded in
+    # time or memory. Either way None then means no embedding exists.
+    def beam_isomorphism(self, width=BEAM_WIDTH, rank=Rank.COST,
+                         adaptive=False, fallback=False):
+        while True:
+            result, truncated = self._beam_search(width, rank)
+            if result is not None or not truncated:
+                return result
+            if not adaptive:
+                break
+            width *= 2
+        if not fallback:
+            return None
+        cost, mapping = self.root_node.rollout_completion()
+        return None if mapping is None else (cost, mapping)
+
+    def _beam_search(self, width, rank):
+        best = None
+        truncated = False
+        beam = [self.root_node]
+        while beam:
+            if beam[0].is_isomorphism():
+                node = min(beam, key=lambda node: node.cost)
+                self.solution(node)
+                if best is None or node.cost < best[0]:
+                    best = (node.cost, node.target_to_pattern_map)
+                break
+
+            children = [child for node in beam
+                        for child in node.generate_children()]
+            if rank == Rank.ROLLOUT:
+                values = {}
+                for child in children:
+                    cost, mapping = child.rollout_completion()
+                    values[child] = cost
+                    if mapping is not None and \
+                            (best is None or cost < best[0]):
+                        best = (cost, mapping)
+                children = [child for child in children
+                            if values[child] != float('+inf')]
+                key = values.__getitem__
+            else:
+                key = lambda node: node.cost
+
+            if len(children) > width:
+                truncated = True
+                children = heapq.nsmallest(width, children, key=key)
+            beam = children
+        return best, truncated
+
+    # Monte Carlo tree search with UCT selection. Each iteration descends
+    # the statistics tree, adds one child, rolls it out and credits the
+    # completion's cost to every ancestor. The cheapest completion seen so
+    # far is returned when the time budget (in seconds) or iteration count
+    # runs out; rollouts stop at the deadline too, so the budget holds
+    # however long a rollout backtracks. The incumbent starts as the greedy
+    # dive from the root, which finds a mapping unless it hits a dead end;
+    # None means nothing was found in time. Children that already cost as
+    # much as the incumbent are never added, so if the tree is exhausted
+    # first, the result is optimal.
+    def mcts_isomorphism(self, time_budget=None, iterations=None,
+                         exploration=UCT_EXPLORATION):
+        deadline = None
+        if time_budget is not None:
+            deadline = time.monotonic() + time_budget
+
+        best = self.root_node.greedy_completion()
+        root = UCTNode(self.root_node)
+        n_iterations = 0
+        while not root.exhausted:
+            if iterations is not None and n_iterations >= iterations:
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            n_iterations += 1
+
+            scale = best[0] if best is not None and best[0] > 0 else 1
+            leaf = root
+            while not leaf.untried and leaf.children:
+                leaf = leaf.select(exploration, scale)
+
+            if leaf.node.is_isomorphism():
+                self.solution(leaf.node)
+                cost, mapping = leaf.node.cost, leaf.node.target_to_pattern_map
+                leaf.untried = []
+            else:
+                leaf.expand(best)
+                if not leaf.untried:
+                    leaf.update_exhausted()
+                    continue
+                leaf = leaf.add_child(leaf.untried.pop())
+                try:
+                    cost, mapping = leaf.node.rollout_completion(deadline)
+                except SearchTimeout:
+                    break
+                if mapping is None:
+                    leaf.untried = []
+                    leaf.update_exhausted()
+                    continue
+
+            if best is None or cost < best[0]:
+                best = (cost, mapping)
+            leaf.backpropagate(cost)
+            leaf.update_exhausted()
+
+        return best
+
+    # Reports an accepted embedding to the tracer
+    def solution(self, node):
+        if self.tracer is not None:
+            self.tracer.solution(node)
+
+    # Rebuilds the node reached by `assignments` as a chain of unmaterialized
+    # nodes, adding up each pair's cost as generate_cost would.
+    def replay(self, assignments):
+        node = self.root_node
+        assigned = set()
+        for target_node, pattern_node in assignments:
+            cost = 0
+            for neighbor, weight in self.neighbor_weights[target_node]:
+                if neighbor in assigned:
+                    cost += weight
+            node = self.node_class(self, node, target_node, pattern_node,
+                                   node.cost + cost)
+            assigned.add(target_node)
+        return node
+
+
+# Queue entry standing for the children of `parent` built from
+# pairs[index:], where pairs are (cost, target node, pattern node) in the
+# order TreeNode.ranked_pairs gives them.
+class Cursor:
+    def __init__(self, parent, pairs, serial, index=0):
+        self.parent = parent
+        self.pairs = pairs
+        self.serial = serial
+        self.index = index
+
+    def priority(self):
+        return (-self.parent.depth - 1, self.pairs[self.index][0],
+                self.serial, self.index)
+
+    def child(self):
+        cost, target_node, pattern_node = self.pairs[self.index]
+        GM = self.parent.GM
+        return GM.node_class(GM, self.parent, target_node, pattern_node, cost)
+
+
+class UCTNode:
+    def __init__(self, node, parent=None):
+        self.node = node
+        self.parent = parent
+        self.children = []
+        # Unvisited children, cheapest last; None until first expanded
+        self.untried = None
+        self.visits = 0
+        self.total_cost = 0
+        self.exhausted = False
+
+    def expand(self, best):
+        if self.untried is None:
+            self.untried = sorted(
+                (child for child in self.node.generate_children()
+                 if best is None or child.cost < best[0]),
+                key=lambda child: -child.cost)
+
+    def add_child(self, node):
+        child = UCTNode(node, self)
+        self.children.append(child)
+        return child
+
+    # Lower is better: mean completion cost relative to the incumbent,
+    # less the exploration bonus.
+    def select(self, exploration, scale):
+        log_visits = math.log(max(self.visits, 1))
+
+        def score(child):
+            if child.visits == 0:
+                return float('-inf')
+            mean = child.total_cost / child.visits / scale
+            return mean - exploration * math.sqrt(log_visits / child.visits)
+        return min(self.children, key=score)
+
+    def backpropagate(self, cost):
+        node = self
+        while node is not None:
+            node.visits += 1
+            node.total_cost += cost
+            node = node.parent
+
+    def update_exhausted(self):
+        node = self
+        while node is not None:
+            if node.untried is None or node.untried:
+                return
+            node.children = [c for c in node.children if not c.exhausted]
+            if node.children:
+                return
+            node.exhausted = True
+            node = node.parent
+
+
+_worker_matcher = None
+
+
+def _init_rollout_worker(target, pattern, cache_size):
+    global _worker_matcher
+    _worker_matcher = GraphMatcher(target, pattern, cache_size=cache_size)
+
+
+def _rollout_worker(assignments):
+    return _worker_matcher.replay(assignments).rollout_completion()
+
+
+# Search states share structure with their ancestors: a child records only
+# the pair it adds, and its maps are rebuilt from the nearest materialized
+# ancestor the first time they are read. Frontier nodes that are never
+# expanded, and the ancestors replay rebuilds for nodes read back from
+# disk, therefore never hold maps of their own.
 class TreeNode:
-    def __init__(self, GM):
+    RULES = ("conglomerate_rule",)
+
+    def __init__(self, GM, parent=None, target_node=None, pattern_node=None,
+                 cost=0):
         self.target = GM.target
         self.pattern = GM.pattern
 
         self.GM = GM
 
-        self.target_to_pattern_map = {}
-        self.pattern_to_target_map = {}
-
-        self.inout_target = {}
-        self.inout_pattern = {}
-
-        self.target_node = None
-        self.pattern_node = None
+        self.target_node = target_node
+        self.pattern_node = pattern_node
 
-        self.depth = 0
-        self.cost = 0
+        self.parent = parent
+        if parent is None:
+            self.depth = 0
+            # (target_to_pattern_map, pattern_to_target_map,
+            #  inout_target, inout_pattern)
+            self.state = ({}, {}, {}, {})
+        else:
+            self.depth = parent.depth + 1
+            self.state = None
+        self.cost = cost
+        self.key = None
+
+    @property
+    def target_to_pattern_map(self):
+        return self.materialize()[0]
+
+    @property
+    def pattern_to_target_map(self):
+        return self.materialize()[1]
+
+    @property
+    def inout_target(self):
+        return self.materialize()[2]
+
+    @property
+    def inout_pattern(self):
+        return self.materialize()[3]
+
+    def materialize(self):
+        if self.state is None:
+            path = []
+            node = self
+            while node.state is None:
+                path.append(node)
+                node = node.parent
+            state = tuple(dict(m) for m in node.state)
+            for node in reversed(path):
+                self.assign(state, node.target_node, node.pattern_node,
+                            node.depth)
+            self.state = state
+        return self.state
+
+    def assign(self, state, target_node, pattern_node, depth):
+        target_to_pattern_map, pattern_to_target_map, \
+            inout_target, inout_pattern = state
+
+        target_to_pattern_map[target_node] = pattern_node
+        pattern_to_target_map[pattern_node] = target_node
+
+        # Every assigned node is already in its inout vector, so only the
+        # neighbours of the new pair can enter it at this depth.
+        if target_node not in inout_target:
+            inout_target[target_node] = depth
+        for neighbor in self.target[target_node]:
+            if neighbor not in inout_target:
+                inout_target[neighbor] = depth
 
-        self.parent = None
+        if pattern_node not in inout_pattern:
+            inout_pattern[pattern_node] = depth
+        for neighbor in self.pattern[pattern_node]:
+            if neighbor not in inout_pattern:
+                inout_pattern[neighbor] = depth
 
     def get_hashable_state(self):
         if self.parent is None:
@@ -141,7 +626,7 @@ class TreeNode:
         print()
 
     def is_isomorphism(self):
-        return len(self.target_to_pattern_map) == len(self.pattern)
+        return self.depth == len(self.pattern)
 
     def syntactic_feasibility(self, target_node, pattern_node):
         return self.conglomerate_rule(target_node, pattern_node)
@@ -152,21 +637,78 @@ class TreeNode:
 
     def generate_cost(self, target_node, pattern_node):
         target_cost = 0
-        for neighbor in self.target[target_node]:
-            if neighbor in self.target_to_pattern_map:
-                target_cost += self.target[target_node][neighbor]['weight']
+        target_to_pattern_map = self.target_to_pattern_map
+        for neighbor, weight in self.GM.neighbor_weights[target_node]:
+            if neighbor in target_to_pattern_map:
+                target_cost += weight
         return target_cost
 
+    # generate_cost for each of `target_nodes` at once: one gather-sum over
+    # their rows of the compiled adjacency, so the work is their total
+    # degree plus the depth. Zero weights stand in for unassigned
+    # neighbours, so the sums match generate_cost exactly.
+    def generate_costs(self, target_nodes):
+        GM = self.GM
+        mapped = [GM.target_index[t] for t in self.target_to_pattern_map]
+        GM.assigned[mapped] = True
+        rows = np.array([GM.target_index[t] for t in target_nodes],
+                        dtype=np.intp)
+        starts = GM.indptr[rows]
+        lengths = GM.indptr[rows + 1] - starts
+        segments = np.repeat(np.arange(len(rows)), lengths)
+        slots = np.arange(len(segments)) \
+            + np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        costs = np.bincount(
+            segments,
+            weights=GM.weights[slots] * GM.assigned[GM.indices[slots]],
+            minlength=len(rows))
+        GM.assigned[mapped] = False
+        return costs.tolist()
+
+    # Lower bound on the weight the unassigned pattern edges will add. An
+    # edge leaving an assigned pattern node must land on an edge from that
+    # node's image to an unassigned target node; the edges between
+    # unassigned pattern nodes land on distinct target edges, so together
+    # they weigh at least as much as the same number of lightest edges.
+    def remaining_cost_bound(self):
+        target_to_pattern_map, pattern_to_target_map, _, _ = \
+            self.materialize()
+
+        bound = 0
+        assigned_edges = 0
+        frontier_edges = 0
+        cheapest_exit = {}
+        for pattern_node, target_node in pattern_to_target_map.items():
+            for neighbor in self.GM.pattern_neighbors[pattern_node]:
+                if neighbor in pattern_to_target_map:
+                    assigned_edges += 1
+                    continue
+                frontier_edges += 1
+                if target_node not in cheapest_exit:
+                    cheapest_exit[target_node] = next(
+                        (w for w, n in self.GM.incident_weights[target_node]
+                         if n not in target_to_pattern_map),
+                        float('+inf'))
+                bound += cheapest_exit[target_node]
+
+        free_edges = self.GM.n_pattern_edges \
+            - assigned_edges // 2 - frontier_edges
+        if free_edges >= len(self.GM.cheapest_weights):
+            return float('+inf')
+        return bound + self.GM.cheapest_weights[free_edges]
+
     def conglomerate_rule(self, target_node, pattern_node):
         assigned_target_count = 0
         target_count = 0
 
         pattern, target = self.pattern, self.target
+        target_to_pattern_map, pattern_to_target_map, \
+            inout_target, inout_pattern = self.materialize()
 
         for neighbor in target[target_node]:
-            neighbor_assigned = neighbor in self.target_to_pattern_map
+            neighbor_assigned = neighbor in target_to_pattern_map
             if neighbor_assigned:
-                neighbor_in_pattern = self.target_to_pattern_map[neighbor]
+                neighbor_in_pattern = target_to_pattern_map[neighbor]
                 if neighbor_in_pattern not in pattern[pattern_node]:
                     return False
                 elif target.number_of_edges(neighbor, target_node) \
@@ -174,7 +716,7 @@ class TreeNode:
                                                    pattern_node):
                     return False
 
-            if neighbor in self.inout_target:
+            if neighbor in inout_target:
                 if neighbor_assigned:
                     assigned_target_count += 1
             else:
@@ -184,9 +726,9 @@ class TreeNode:
         pattern_count = 0
 
         for neighbor in pattern[pattern_node]:
-            neighbor_assigned = neighbor in self.pattern_to_target_map
+            neighbor_assigned = neighbor in pattern_to_target_map
             if neighbor_assigned:
-                neighbor_in_target = self.pattern_to_target_map[neighbor]
+                neighbor_in_target = pattern_to_target_map[neighbor]
                 if neighbor_in_target not in target[target_node]:
                     return False
                 elif pattern.number_of_edges(neighbor, pattern_node) \
@@ -194,7 +736,7 @@ class TreeNode:
                                                   target_node):
                     return False
 
-            if neighbor in self.inout_pattern:
+            if neighbor in inout_pattern:
                 if neighbor_assigned:
                     assigned_pattern_count += 1
             else:
@@ -203,53 +745,24 @@ class TreeNode:
         return (assigned_pattern_count >= assigned_target_count) \
             and (target_count >= pattern_count)
 
-    def add_node_assignment(self, target_node, pattern_node):
-        self.target_to_pattern_map[target_node] = pattern_node
-        self.pattern_to_target_map[pattern_node] = target_node
-
-        self.target_node = target_node
-        self.pattern_node = pattern_node
-
-        self.depth += 1
-        self.cost += self.generate_cost(target_node, pattern_node)
-
-        if target_node not in self.inout_target:
-            self.inout_target[target_node] = self.depth
-
-        if pattern_node not in self.inout_pattern:
-            self.inout_pattern[pattern_node] = self.depth
-
-        new_nodes = set()
-        for node in self.target_to_pattern_map:
-            new_nodes.update(
-                [neighbor for neighbor in self.target[node]
-                 if neighbor not in self.target_to_pattern_map
-                 ]
-            )
-
-        for node in new_nodes:
-            if node not in self.inout_target:
-                self.inout_target[node] = self.depth
-
-        new_nodes = set()
-        for node in self.pattern_to_target_map:
-            new_nodes.update(
-                [neighbor for neighbor in self.pattern[node]
-                 if neighbor not in self.pattern_to_target_map
-                 ]
-            )
-
-        for node in new_nodes:
-            if node not in self.inout_pattern:
-                self.inout_pattern[node] = self.depth
+    def assignments(self):
+        pairs = []
+        node = self
+        while node.parent is not None:
+            pairs.append((node.target_node, node.pattern_node))
+            node = node.parent
+        pairs.reverse()
+        return pairs
 
     def generate_candidate_pairs(self):
         min_key = self.GM.pattern_node_order.__getitem__
+        target_to_pattern_map, pattern_to_target_map, \
+            inout_target, inout_pattern = self.materialize()
 
-        t_target_inout = [node for node in self.inout_target
-                          if node not in self.target_to_pattern_map]
-        t_pattern_inout = [node for node in self.inout_pattern
-                           if node not in self.pattern_to_target_map]
+        t_target_inout = [node for node in inout_target
+                          if node not in target_to_pattern_map]
+        t_pattern_inout = [node for node in inout_pattern
+                           if node not in pattern_to_target_map]
 
         if t_target_inout and t_pattern_inout:
             pattern_node = min(t_pattern_inout, key=min_key)
@@ -258,32 +771,113 @@ class TreeNode:
 
         else:
             pattern_node = min(self.GM.pattern_nodes
-                               - set(self.pattern_to_target_map),
+                               - set(pattern_to_target_map),
                                key=min_key)
             for target_node in self.target:
-                if target_node not in self.target_to_pattern_map:
+                if target_node not in target_to_pattern_map:
                     yield target_node, pattern_node
 
     def generate_children(self):
-        for target_node, pattern_node in self.generate_candidate_pairs():
-            if self.syntactic_feasibility(target_node, pattern_node):
-                child = deepcopy(self)
-                child.add_node_assignment(target_node, pattern_node)
-                child.parent = self
-                yield child
+        self.materialize()
+        pairs = [pair for pair in self.generate_candidate_pairs()
+                 if self.syntactic_feasibility(*pair)]
+        if not pairs:
+            return
+        costs = self.generate_costs([target_node for target_node, _ in pairs])
+        for (target_node, pattern_node), cost in zip(pairs, costs):
+            yield self.GM.node_class(self.GM, self, target_node, pattern_node,
+                                     self.cost + cost)
+
+    # Feasible extensions as (cost, target node, pattern node), cheapest
+    # first and otherwise in generate_children order, without building
+    # the children.
+    def ranked_pairs(self):
+        self.materialize()
+        feasible = [pair for pair in self.generate_candidate_pairs()
+                    if self.syntactic_feasibility(*pair)]
+        if not feasible:
+            return []
+        costs = self.generate_costs(
+            [target_node for target_node, _ in feasible])
+        pairs = [(self.cost + cost, target_node, pattern_node)
+                 for (target_node, pattern_node), cost in zip(feasible, costs)]
+        pairs.sort(key=itemgetter(0))
+        return pairs
+
+    # The pattern node assigned at each depth depends only on which pattern
+    # nodes are already assigned, so the mapping alone identifies a state.
+    def canonical_key(self):
+        if self.key is None:
+            if self.parent is None:
+                self.key = ()
+            else:
+                key = list(self.parent.canonical_key())
+                insort(key, (self.GM.pattern_node_order[self.pattern_node],
+                             self.target_node))
+                self.key = tuple(key)
+        return self.key
 
     def rollout(self):
-        search_queue = PriorityQueue()
-        search_queue.push(self, (-self.depth, self.cost))
-
-        while not search_queue.empty():
-            node = search_queue.pop()
-            if node.is_isomorphism():
-                return node.cost
-            child_nodes = node.generate_children()
-            for child in child_nodes:
-                search_queue.push(child, (-child.depth, child.cost))
-        return float('+inf')
+        return self.rollout_completion()[0]
+
+    # Follows the cheapest feasible child down without backtracking, so it
+    # costs one ranked_pairs per depth; None at a dead end.
+    def greedy_completion(self):
+        node = self
+        while not node.is_isomorphism():
+            pairs = node.ranked_pairs()
+            if not pairs:
+                return None
+            node = Cursor(node, pairs, 0).child()
+        self.GM.solution(node)
+        return node.cost, node.target_to_pattern_map
+
+    # Greedy completion of this state, remembered in the matcher's
+    # transposition table. The greedy search always finishes a node's
+    # subtree before returning to shallower nodes, so every node it expands
+    # either lies on the path to the completion it finds, and would have
+    # found that completion too, or has an exhausted subtree. Both kinds
+    # are cached along with the start. Only the keys of the last
+    # `cache.maxsize` expanded nodes are kept, as the cache would evict any
+    # before them, and the path is cached last so that it is evicted last.
+    # A search stopped by the `deadline` raises SearchTimeout and caches
+    # nothing.
+    def rollout_completion(self, deadline=None):
+        cache = self.GM.rollout_cache
+        result = cache.get(self.canonical_key())
+        if result is not None:
+            return result
+
+        expanded = deque(maxlen=cache.maxsize) if cache.maxsize else None
+        node = self.GM.lazy_best_first(self, deadline, expanded)
+        if node is None:
+            result = (float('+inf'), None)
+        else:
+            result = (node.cost, node.target_to_pattern_map)
+
+        # Nodes read back from a spilled frontier are copies rebuilt from
+        # the root, so the path is walked by depth and matched by key.
+        path = []
+        if result[1] is not None:
+            while node.depth > self.depth:
+                path.append(node.canonical_key())
+                node = node.parent
+            path.append(self.canonical_key())
+        if expanded is not None:
+            on_path = set(path)
+            dead_end = (float('+inf'), None)
+            for key in expanded:
+                if key not in on_path:
+                    cache.put(key, dead_end)
+        for key in path:
+            cache.put(key, result)
+        return result
+
+
+class TracedTreeNode(TreeNode):
+    def syntactic_feasibility(self, target_node, pattern_node):
+        return traced_feasibility(
+            self, self.GM.tracer, target_node, pattern_node)
 
 
 def main():
@@ -306,12 +900,8 @@ def main():
     nx.drawing.nx_pydot.write_dot(H, 'graphs/pattern.dot')
 
     GM = GraphMatcher(G, H)
-    isomorphisms, iso_tree = GM.isomorphism_search_tree()
-
-    for u, v in iso_tree.edges:
-        iso_tree[u][v]['label'] = iso_tree[u][v]['weight']
-
-    nx.drawing.nx_pydot.write_dot(iso_tree, 'graphs/isomorphism_search.dot')
+    isomorphisms, recorder = GM.isomorphism_search_tree()
+    recorder.write_dot('graphs/isomorphism_search.dot')
 
     for iso in isomorphisms:
         iso.debug_print()
@@ -0,0 +1,94 @@
+from collections import Counter, defaultdict
+import time
+
+# Every TIMING_INTERVAL-th candidate has its rules timed
+TIMING_INTERVAL = 16
+
+
+# Per-rule and per-depth counters of a search, filled in by a matcher
+# built with stats=. Rules run in the node's RULES order, so each rule
+# sees only the candidates every earlier rule accepted. Depths are those
+# of the node the candidates extend, i.e. the number of pairs assigned.
+#
+# Counts cover every candidate, but times are sampled: a pair of clock
+# reads costs about as much as a cheap rule, so timing every call would
+# mostly measure the clock. `timed` counts the calls each rule's `rule_ns`
+# covers.
+class SearchStats:
+    def __init__(self):
+        self.candidates = 0
+        self.seen = Counter()
+        self.rejected = Counter()
+        self.timed = Counter()
+        self.rule_ns = Counter()
+        # depth -> number of feasible children -> nodes
+        self.branching = defaultdict(Counter)
+        # depth -> rule -> candidates it rejected
+        self.prunes = defaultdict(Counter)
+
+    # trace.traced_feasibility, with every rule counted and sampled rules
+    # timed
+    def feasibility(self, node, tracer, target_node, pattern_node):
+        self.candidates += 1
+        timed = self.candidates % TIMING_INTERVAL == 0
+        clock = time.perf_counter_ns
+        for rule in node.RULES:
+            self.seen[rule] += 1
+            if timed:
+                self.timed[rule] += 1
+                start = clock()
+                feasible = getattr(node, rule)(target_node, pattern_node)
+                self.rule_ns[rule] += clock() - start
+            else:
+                feasible = getattr(node, rule)(target_node, pattern_node)
+            if not feasible:
+                self.rejected[rule] += 1
+                self.prunes[node.depth][rule] += 1
+                tracer.prune(node, target_node, pattern_node, rule)
+                return False
+        return True
+
+    # Called once a node at `depth` is done with its candidates; a search
+    # stopped at a solution reports the children expanded so far.
+    def branch(self, depth, children):
+        self.branching[depth][children] += 1
+
+    def rejection_rate(self, rule):
+        seen = self.seen[rule]
+        return self.rejected[rule] / seen if seen else 0.0
+
+    def mean_rule_ns(self, rule):
+        timed = self.timed[rule]
+        return self.rule_ns[rule] / timed if timed else 0.0
+
+    # Over the nodes that had children: every node but the root is some
+    # node's child, so counting dead ends too gives (N - 1) / N.
+    def mean_branching(self):
+        nodes = sum(count for h in self.branching.values()
+                    for factor, count in h.items() if factor > 0)
+        children = sum(factor * count for h in self.branching.values()
+                       for factor, count in h.items())
+        return children / nodes if nodes else 0.0
+
+    def as_dict(self):
+        return {
+            "seen": dict(self.seen),
+            "rejected": dict(self.rejected),
+            "timed": dict(self.timed),
+            "rule_ns": dict(self.rule_ns),
+            "branching": {depth: dict(h)
+                          for depth, h in sorted(self.branching.items())},
+            "prunes": {depth: dict(h)
+                       for depth, h in sorted(self.prunes.items())},
+        }
+
+    def report(self):
+        lines = [f"{'rule':<18}{'seen':>10}{'rejected':>10}{'rate':>8}"
+                 f"{'ns/cand':>10}"]
+        for rule in self.seen:
+            lines.append(f"{rule:<18}{self.seen[rule]:>10}"
+                         f"{self.rejected[rule]:>10}"
+                         f"{self.rejection_rate(rule):>8.3f}"
+                         f"{self.mean_rule_ns(rule):>10.0f}")
+        lines.append(f"mean branching factor {self.mean_branching():.2f}")
+        return "\n".join(lines)
@@ -0,0 +1,125 @@
+"""Per-instance result store for benchmark sweeps.
+
+The store is row-oriented on purpose: an append-only CSV file with one row
+per engine run. A sweep finishes instances one at a time, in any order,
+and each must be on disk as soon as it finishes, so that an interrupted
+sweep can resume. Appending rows does that with one write and fsync.
+Columnar files do not append: an npz archive has to be rewritten whole
+for every instance, and parquet needs pyarrow, which is not a dependency,
+and leaves one row group per write. Stores hold one row per run and stay
+small, and pandas.read_csv reads one into columns for analysis.
+"""
+from collections import defaultdict
+import csv
+import json
+import os
+
+# One row per engine run, as produced by sweep.run_instance
+FIELDS = (
+    "size", "density", "ratio", "iteration", "seed", "engine", "status",
+    "result",
+    "expansions", "construct_ns", "search_ns", "construct_cpu_ns",
+    "search_cpu_ns", "peak_memory", "stats", "ordering",
+)
+INT_FIELDS = (
+    "size", "iteration", "seed", "expansions", "construct_ns", "search_ns",
+    "construct_cpu_ns", "search_cpu_ns", "peak_memory",
+)
+FLOAT_FIELDS = ("density", "ratio")
+JSON_FIELDS = ("stats", "ordering")
+
+
+def instance_key(record):
+    return (record["size"], record["density"], record["ratio"],
+            record["iteration"], record["seed"])
+
+
+def parse_result(value):
+    if value in ("True", "False"):
+        return value == "True"
+    return float(value) if value else None
+
+
+def parse_record(row):
+    record = dict(row)
+    for field in INT_FIELDS:
+        record[field] = int(row[field]) if row[field] else None
+    for field in FLOAT_FIELDS:
+        record[field] = float(row[field])
+    record["result"] = parse_result(row["result"])
+    for field in JSON_FIELDS:
+        record[field] = json.loads(row[field]) if row.get(field) else None
+    # Stores written before runs were isolated only hold finished runs
+    record.setdefault("status", "ok")
+    return record
+
+
+# SearchStats and RuleOrdering dicts are stored as JSON
+def encode_record(record):
+    encoded = dict(record)
+    for field in JSON_FIELDS:
+        value = record.get(field)
+        encoded[field] = "" if value is None else json.dumps(value)
+    return encoded
+
+
+# Append-only CSV of per-instance records. Each instance's records are
+# written and flushed as soon as it finishes, so an interrupted sweep loses
+# at most the instances in flight. A row cut short by a crash is ignored
+# when reading and the next append starts on a fresh line.
+class ResultStore:
+    def __init__(self, path):
+        self.path = path
+
+    def records(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, newline="") as f:
+            for row in csv.DictReader(f):
+                if None in row.values() or None in row:
+                    continue
+                try:
+                    yield parse_record(row)
+                except ValueError:
+                    continue
+
+    # Records of each stored instance, keyed by instance_key. An instance
+    # rerun after an interruption keeps the latest record of each engine.
+    def instances(self):
+        instances = defaultdict(dict)
+        for record in self.records():
+            instances[instance_key(record)][record["engine"]] = record
+        return {key: list(records.values())
+                for key, records in instances.items()}
+
+    # The records of `engines` for each instance that has a record of
+    # every one of them, keyed by instance_key
+    def completed(self, engines):
+        completed = {}
+        for key, records in self.instances().items():
+            records = [r for r in records if r["engine"] in engines]
+            if {r["engine"] for r in records} == set(engines):
+                completed[key] = records
+        return completed
+
+    def append(self, records):
+        new = not os.path.exists(self.path) or \
+            os.path.getsize(self.path) == 0
+        if not new:
+            with open(self.path, newline="") as f:
+                header = next(csv.reader(f))
+            if tuple(header) != FIELDS:
+                raise ValueError(
+                    f"{self.path} has columns {header}, expected {FIELDS}")
+        with open(self.path, "a+b") as f:
+            if not new:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+        with open(self.path, "a", newline="") as f:
+            writer = csv.DictWriter(f, FIELDS, lineterminator="\n")
+            if new:
+                writer.writeheader()
+            writer.writerows(encode_record(record) for record in records)
+            f.flush()
+            os.fsync(f.fileno())
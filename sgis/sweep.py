@@ -0,0 +1,438 @@
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+from itertools import product
+import argparse
+import json
+import sys
+
+import networkx as nx
+import numpy as np
+import scipy
+
+from sgis.benchmark import (
+    ENGINES,
+    ERROR,
+    OK,
+    OOM,
+    TIMEOUT,
+    WEIGHTED_ENGINES,
+    generate_benchmark_pair,
+    generate_weighted_benchmark_pair,
+    instance_seed,
+    measure,
+    measure_isolated,
+    parse_sizes,
+)
+from sgis.corpus import Corpus, load_instance
+from sgis.formats import Format, read_instance_list, read_pair
+from sgis.store import ResultStore, instance_key
+from sgis.util import censored_median, geometric_mean
+
+# Defaults reproduce the sweep in main.main()
+SWEEP_SIZES = "30:130:5"
+SWEEP_DENSITIES = (0.10,)
+SWEEP_RATIOS = (0.75,)
+SWEEP_ENGINES = ("vf2", "combined=ref")
+SWEEP_ITERATIONS = 100
+SWEEP_SEED = 314159
+
+
+# Instances come from `load`, which reads them from a corpus or a suite's
+# files, or are generated from `seed`. With a timeout or memory limit each
+# engine runs in its own child process.
+def run_instance(task):
+    size, density, ratio, iteration, seed, engines, weighted, \
+        repeats, warmup, memory, stats, timeout, memory_limit, load = task
+    if load is not None:
+        G, H = load()
+    elif weighted:
+        G, H = generate_weighted_benchmark_pair(size, density, ratio,
+                                                seed=seed)
+    else:
+        G, H = generate_benchmark_pair(size, density, ratio, seed=seed)
+    registry = WEIGHTED_ENGINES if weighted else ENGINES
+    records = []
+    for name in engines:
+        if timeout is None and memory_limit is None:
+            status = OK
+            m = measure(registry[name], G, H, repeats=repeats,
+                        warmup=warmup, memory=memory, stats=stats)
+        else:
+            status, m = measure_isolated(
+                registry[name], G, H, timeout=timeout,
+                memory_limit=memory_limit, repeats=repeats, warmup=warmup,
+                memory=memory, stats=stats)
+        records.append({
+            "size": size,
+            "density": density,
+            "ratio": ratio,
+            "iteration": iteration,
+            "seed": seed,
+            "engine": name,
+            "status": status,
+            "result": m.result,
+            "expansions": m.expansions,
+            "construct_ns": m.construct_ns,
+            "search_ns": m.search_ns,
+            "construct_cpu_ns": m.construct_cpu_ns,
+            "search_cpu_ns": m.search_cpu_ns,
+            "peak_memory": m.peak_memory,
+            "stats": m.stats,
+            "ordering": m.ordering,
+        })
+    return records
+
+
+# Columns of one sweep point, named as main.py and heuristic-main.py name
+# them so figures/main.py can plot either output. Decision engines report
+# expansions and search time, plus the fraction of instances on which
+# every engine agrees with the first; weighted engines report search time
+# and cost relative to the reference engine. Every engine also gets its
+# construction time (`ctime`), search CPU time (`cpu`) and, when measured,
+# peak memory (`mem`), and, when collected, the rule statistics of
+# stats_columns. Engines that reorder their rules get the counters of
+# ordering_columns.
+#
+# Runs that timed out are censored at the timeout: their time is only a
+# lower bound. Time means and deviations include those bounds, making the
+# mean a lower bound too, and `median` is the censored median, infinite
+# once half the runs are censored. Runs that ran out of memory or failed
+# say nothing about time and are left out of the time columns. The
+# `timeouts`, `ooms` and `errors` columns count each outcome. Everything
+# else (expansions, costs, agreement, resources) is taken over the runs
+# that finished.
+def aggregate(instances, engines, prefixes, weighted, reference):
+    columns = {}
+    by_engine = {name: [] for name in engines}
+    for records in instances:
+        for record in records:
+            by_engine[record["engine"]].append(record)
+
+    if weighted:
+        for name in engines:
+            finished = [
+                (r["result"], c["result"])
+                for r, c in zip(by_engine[name], by_engine[reference])
+                if r["status"] == OK and c["status"] == OK
+            ]
+            costs = [cost_ratio(cost, reference_cost)
+                     for cost, reference_cost in finished]
+            costs = [ratio for ratio in costs if ratio is not None]
+            p = prefixes[name]
+            times = time_columns(by_engine[name], p)
+            columns[f"{p}time"] = times.pop(f"{p}time")
+            columns[f"{p}tstd"] = times.pop(f"{p}tstd")
+            columns[f"{p}cost"] = mean_or_nan(costs)
+            columns[f"{p}cstd"] = gstd_or_nan(costs)
+            columns.update(times)
+            columns.update(resource_columns(by_engine[name], p))
+        return columns
+
+    for name in engines:
+        expansions = [r["expansions"] for r in by_engine[name]
+                      if r["status"] == OK]
+        p = prefixes[name]
+        times = time_columns(by_engine[name], p)
+        columns[f"{p}mean"] = mean_or_nan(expansions)
+        columns[f"{p}std"] = gstd_or_nan(expansions)
+        columns[f"{p}time"] = times.pop(f"{p}time")
+        times.pop(f"{p}tstd")
+        columns.update(times)
+        columns.update(resource_columns(by_engine[name], p))
+        columns.update(stats_columns(by_engine[name], p))
+        columns.update(ordering_columns(by_engine[name], p))
+    agree = [len({r["result"] for r in records if r["status"] == OK}) <= 1
+             for records in instances]
+    columns["accuracy"] = np.mean(agree)
+    return columns
+
+
+# Patterns with no edges (single nodes) embed at cost 0, which matches a
+# reference cost of 0; a positive cost against a zero reference has no
+# finite ratio and is left out of the cost columns.
+def cost_ratio(cost, reference_cost):
+    if reference_cost == 0:
+        return 1.0 if cost == 0 else None
+    return cost / reference_cost
+
+
+def time_columns(records, p):
+    statuses = Counter(r["status"] for r in records)
+    records = [r for r in records if r["status"] in (OK, TIMEOUT)]
+    times = [r["search_ns"] for r in records]
+    censored = [r["status"] == TIMEOUT for r in records]
+    return {
+        f"{p}time": mean_or_nan(times),
+        f"{p}tstd": gstd_or_nan(times),
+        f"{p}median": censored_median(times, censored),
+        f"{p}timeouts": statuses[TIMEOUT],
+        f"{p}ooms": statuses[OOM],
+        f"{p}errors": statuses[ERROR],
+    }
+
+
+def resource_columns(records, p):
+    records = [r for r in records if r["status"] == OK]
+    columns = {
+        f"{p}ctime": mean_or_nan([r["construct_ns"] for r in records]),
+        f"{p}cpu": mean_or_nan([r["search_cpu_ns"] for r in records]),
+    }
+    if records and records[0]["peak_memory"] is not None:
+        columns[f"{p}mem"] = mean_or_nan(
+            [r["peak_memory"] for r in records])
+    return columns
+
+
+# Pooled over the point's finished runs: the fraction of the candidates
+# reaching each rule that it rejects (`{rule}_rej`), its mean time per
+# timed candidate (`{rule}_ns`), and the mean branching factor of the
+# nodes that had children (`branching`; see SearchStats.mean_branching).
+def stats_columns(records, p):
+    runs = [r["stats"] for r in records
+            if r["status"] == OK and r["stats"] is not None]
+    if not runs:
+        return {}
+    seen, rejected, timed, rule_ns = Counter(), Counter(), Counter(), Counter()
+    nodes = children = 0
+    for run in runs:
+        seen.update(run["seen"])
+        rejected.update(run["rejected"])
+        # Stores written before timing was sampled timed every candidate
+        timed.update(run.get("timed", run["seen"]))
+        rule_ns.update(run["rule_ns"])
+        for histogram in run["branching"].values():
+            for factor, count in histogram.items():
+                if int(factor) > 0:
+                    nodes += count
+                    children += int(factor) * count
+    columns = {}
+    for rule in seen:
+        name = rule.removeprefix("rule_")
+        columns[f"{p}{name}_rej"] = rejected[rule] / seen[rule]
+        columns[f"{p}{name}_ns"] = rule_ns[rule] / timed[rule] \
+            if timed[rule] else float("nan")
+    columns[f"{p}branching"] = children / nodes if nodes else float("nan")
+    return columns
+
+
+# Pooled over the point's finished runs of an engine that reorders its
+# rules: the fraction of all candidates each rule was the first to reject
+# (`{rule}_rejects`), the mean number of reorderings (`reorderings`) and
+# the final rule order most runs ended with (`order`, rules joined by >).
+def ordering_columns(records, p):
+    runs = [r["ordering"] for r in records
+            if r["status"] == OK and r["ordering"] is not None]
+    if not runs:
+        return {}
+    rejected = Counter()
+    for run in runs:
+        rejected.update(run["rejected"])
+    candidates = sum(run["candidates"] for run in runs)
+    columns = {}
+    for rule in runs[0]["rejected"]:
+        name = rule.removeprefix("rule_")
+        columns[f"{p}{name}_rejects"] = rejected[rule] / candidates \
+            if candidates else float("nan")
+    columns[f"{p}reorderings"] = np.mean(
+        [run["reorderings"] for run in runs])
+    orders = Counter(">".join(rule.removeprefix("rule_")
+                              for rule in run["rules"]) for run in runs)
+    columns[f"{p}order"] = orders.most_common(1)[0][0]
+    return columns
+
+
+def mean_or_nan(values):
+    return geometric_mean(values) if values else float("nan")
+
+
+def gstd_or_nan(values):
+    return scipy.stats.gstd(values) if len(values) > 1 else float("nan")
+
+
+# Engines are given as `name` or `name=prefix`, the prefix naming the
+# engine's output columns (`combined=ref` gives refmean, refstd, ...).
+def parse_engines(items):
+    engines = []
+    prefixes = {}
+    for item in items:
+        name, _, prefix = item.partition("=")
+        engines.append(name)
+        prefixes[name] = prefix or name
+    return engines, prefixes
+
+
+# Tasks for the instances of a suite's list. A suite instance has no seed
+# and its point is read off its graphs, which are loaded once here for
+# that: the target's size and density and the pattern's share of the
+# target's nodes. The iteration is its place in the list.
+def suite_tasks(path, format, options):
+    if format is not None:
+        format = Format[format.upper()]
+    tasks = []
+    for j, (_, target_path, pattern_path) in \
+            enumerate(read_instance_list(path)):
+        G, H = read_pair(target_path, pattern_path, format)
+        tasks.append((len(G), round(nx.density(G), 4),
+                      round(len(H) / len(G), 4), j, None, *options,
+                      partial(read_pair, target_path, pattern_path, format)))
+    return tasks
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(
+        description="Run a benchmark sweep and print one CSV row per point.")
+    parser.add_argument("--spec", help="JSON file of option defaults; "
+                        "keys are the long option names")
+    parser.add_argument("--sizes", nargs="+", default=[SWEEP_SIZES],
+                        help="target sizes, or start:stop:step ranges")
+    parser.add_argument("--densities", nargs="+", type=float,
+                        default=list(SWEEP_DENSITIES))
+    parser.add_argument("--ratios", nargs="+", type=float,
+                        default=list(SWEEP_RATIOS))
+    parser.add_argument("--engines", nargs="+", default=list(SWEEP_ENGINES))
+    parser.add_argument("--weighted", action="store_true",
+                        help="weighted targets and rolloutmatcher engines")
+    parser.add_argument("--reference",
+                        help="weighted engine costs are relative to "
+                        "(default: best if run, else the first engine)")
+    parser.add_argument("--iterations", type=int, default=SWEEP_ITERATIONS)
+    parser.add_argument("--seed", type=int, default=SWEEP_SEED)
+    parser.add_argument("--repeats", type=int, default=1,
+                        help="timed runs per engine and instance")
+    parser.add_argument("--warmup", type=int, default=0,
+                        help="untimed runs before the timed ones")
+    parser.add_argument("--memory", action="store_true",
+                        help="record peak memory with tracemalloc")
+    parser.add_argument("--stats", action="store_true",
+                        help="record per-rule and per-depth search "
+                        "statistics (decision engines with fixed rule "
+                        "order only)")
+    parser.add_argument("--timeout", type=float,
+                        help="seconds each engine may run on an instance; "
+                        "runs each engine in its own process")
+    parser.add_argument("--memory-limit", type=int,
+                        help="address space limit in MiB for each engine "
+                        "run; runs each engine in its own process")
+    parser.add_argument("--corpus",
+                        help="run the instances of a corpus directory "
+                        "instead of generating them")
+    parser.add_argument("--instances",
+                        help="run the instances of a benchmark suite, "
+                        "listed one `name pattern target` per line, "
+                        "instead of generating them")
+    parser.add_argument("--format", choices=[f.name.lower() for f in Format],
+                        help="format of the --instances graph files "
+                        "(default: from each file's extension)")
+    parser.add_argument("--store",
+                        help="CSV file to append per-instance records to; "
+                        "instances already in it are skipped")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="worker processes (default: one per core)")
+    return parser
+
+
+def parse_args(argv=None):
+    parser = make_parser()
+    args, _ = parser.parse_known_args(argv)
+    if args.spec is not None:
+        with open(args.spec) as f:
+            spec = json.load(f)
+        for key in ("sizes", "engines"):
+            if key in spec:
+                spec[key] = [str(item) for item in spec[key]]
+        parser.set_defaults(**spec)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    engines, prefixes = parse_engines(args.engines)
+    corpus = None if args.corpus is None else Corpus(args.corpus)
+    weighted = args.weighted if corpus is None else corpus.weighted
+    registry = WEIGHTED_ENGINES if weighted else ENGINES
+    for name in engines:
+        if name not in registry:
+            sys.exit(f"unknown engine {name!r}; "
+                     f"choose from {', '.join(registry)}")
+    uncounted = [name for name in engines if not registry[name].stats]
+    if args.stats and uncounted:
+        sys.exit(f"--stats is not supported by {', '.join(uncounted)}")
+    if args.repeats < 1:
+        sys.exit("--repeats must be at least 1")
+    if corpus is not None and args.instances is not None:
+        sys.exit("--corpus and --instances cannot be combined")
+    reference = args.reference
+    if reference is None:
+        reference = "best" if "best" in engines else engines[0]
+
+    memory_limit = None if args.memory_limit is None \
+        else args.memory_limit * 2**20
+    options = (engines, weighted, args.repeats, args.warmup, args.memory,
+               args.stats, args.timeout, memory_limit)
+    if corpus is not None:
+        tasks = [
+            (entry["size"], entry["density"], entry["ratio"],
+             entry["iteration"], entry["seed"], *options,
+             partial(load_instance, corpus.path(entry)))
+            for entry in corpus.instances
+        ]
+        points = list(dict.fromkeys(task[:3] for task in tasks))
+    elif args.instances is not None:
+        tasks = suite_tasks(args.instances, args.format, options)
+        points = list(dict.fromkeys(task[:3] for task in tasks))
+    else:
+        points = list(product(parse_sizes(args.sizes), args.densities,
+                              args.ratios))
+        tasks = [
+            (size, density, ratio, j,
+             instance_seed(args.seed, size, density, ratio, j),
+             *options, None)
+            for size, density, ratio in points
+            for j in range(args.iterations)
+        ]
+
+    # Instances already in the store are not run again. Finished
+    # instances are stored as they come in, and each point's row is printed
+    # once all of its instances are in and every earlier row is out.
+    store = None if args.store is None else ResultStore(args.store)
+    done = {} if store is None else store.completed(engines)
+    point_keys = defaultdict(list)
+    for task in tasks:
+        point_keys[task[:3]].append(task[:5])
+    remaining = Counter(task[:3] for task in tasks if task[:5] not in done)
+
+    header = None
+    next_point = 0
+
+    def print_ready_rows():
+        nonlocal header, next_point
+        while next_point < len(points) and \
+                remaining[points[next_point]] == 0:
+            size, density, ratio = points[next_point]
+            instances = [done[key] for key in point_keys[points[next_point]]]
+            columns = aggregate(instances, engines, prefixes, weighted,
+                                reference)
+            if header is None:
+                header = ["ntarget", "density", "ratio", *columns]
+                print(",".join(header))
+            print(",".join(map(str, [size, density, ratio,
+                                     *columns.values()])), flush=True)
+            next_point += 1
+
+    with ProcessPoolExecutor(args.jobs) as executor:
+        futures = [executor.submit(run_instance, task)
+                   for task in tasks if task[:5] not in done]
+        print_ready_rows()
+        for future in as_completed(futures):
+            records = future.result()
+            if store is not None:
+                store.append(records)
+            key = instance_key(records[0])
+            done[key] = records
+            remaining[key[:3]] -= 1
+            print_ready_rows()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+from collections import Counter
+import json
+import random
+
+from sgis.util import PriorityQueue
+
+
+# Search events reported by the matchers. A matcher built without a tracer
+# uses its plain node class and never calls any of these.
+class Tracer:
+    def push(self, node):
+        pass
+
+    def pop(self, node):
+        pass
+
+    def prune(self, node, target_node, pattern_node, rule):
+        pass
+
+    def solution(self, node):
+        pass
+
+
+class CountingTracer(Tracer):
+    def __init__(self):
+        self.counts = Counter()
+        self.prunes = Counter()
+
+    def push(self, node):
+        self.counts["push"] += 1
+
+    def pop(self, node):
+        self.counts["pop"] += 1
+
+    def prune(self, node, target_node, pattern_node, rule):
+        self.counts["prune"] += 1
+        self.prunes[rule] += 1
+
+    def solution(self, node):
+        self.counts["solution"] += 1
+
+
+class JSONLinesTracer(Tracer):
+    def __init__(self, file):
+        self.file = file
+
+    def write(self, event, node, **fields):
+        record = {
+            "event": event,
+            "depth": node.depth,
+            "target": node.target_node,
+            "pattern": node.pattern_node,
+        }
+        cost = getattr(node, "cost", None)
+        if cost is not None:
+            record["cost"] = cost
+        record.update(fields)
+        self.file.write(json.dumps(record, default=str) + "\n")
+
+    def push(self, node):
+        self.write("push", node)
+
+    def pop(self, node):
+        self.write("pop", node)
+
+    def prune(self, node, target_node, pattern_node, rule):
+        self.write("prune", node, rule=rule,
+                   candidate=[target_node, pattern_node])
+
+    def solution(self, node):
+        self.write("solution", node)
+
+
+# Forwards each event to `tracer` with probability `rate`.
+class SampledTracer(Tracer):
+    def __init__(self, tracer, rate, seed=None):
+        self.tracer = tracer
+        self.rate = rate
+        self.rng = random.Random(seed)
+
+    def push(self, node):
+        if self.rng.random() < self.rate:
+            self.tracer.push(node)
+
+    def pop(self, node):
+        if self.rng.random() < self.rate:
+            self.tracer.pop(node)
+
+    def prune(self, node, target_node, pattern_node, rule):
+        if self.rng.random() < self.rate:
+            self.tracer.prune(node, target_node, pattern_node, rule)
+
+    def solution(self, node):
+        if self.rng.random() < self.rate:
+            self.tracer.solution(node)
+
+
+# Reports pushes and pops on `queue`, a plain PriorityQueue by default.
+class TracedPriorityQueue:
+    def __init__(self, tracer, queue=None):
+        self.tracer = tracer
+        self.queue = PriorityQueue() if queue is None else queue
+
+    def push(self, item, priority):
+        self.tracer.push(item)
+        self.queue.push(item, priority)
+
+    def empty(self):
+        return self.queue.empty()
+
+    def pop(self):
+        item = self.queue.pop()
+        self.tracer.pop(item)
+        return item
+
+
+# Evaluates a node's RULES in order, reporting the first that rejects.
+def traced_feasibility(node, tracer, target_node, pattern_node):
+    for rule in node.RULES:
+        if not getattr(node, rule)(target_node, pattern_node):
+            tracer.prune(node, target_node, pattern_node, rule)
+            return False
+    return True
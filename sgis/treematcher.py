@@ -1,13 +1,50 @@
 from dataclasses import dataclass
+from enum import Enum
+import logging
+import random
 import sys
 
-from sgis.refinement import Heuristic, Refinement
+from sgis.ordering import RuleOrder, RuleOrdering, static_costs
+from sgis.refinement import Combine, Heuristic, LazyRefinement, Refinement, \
+    TrivialRefinement
+from sgis.trace import Tracer, traced_feasibility
+
+logger = logging.getLogger(__name__)
+
+# Expansions the AUTO probe may spend before the instance counts as hard
+PROBE_EXPANSIONS = 64
+# Random dives averaged into the search tree size estimate
+ESTIMATE_SAMPLES = 16
+
+
+class RefinementMode(Enum):
+    FULL = 0
+    LAZY = 1
+    NONE = 2
+    AUTO = 3
 
 
 class TreeMatcher:
-    def __init__(self, target, pattern, heuristic=Heuristic.UNION):
+    def __init__(self, target, pattern, heuristic=Heuristic.UNION,
+                 combine=Combine.ALL, mode=RefinementMode.FULL, tracer=None,
+                 stats=None, rule_order=RuleOrder.FIXED):
         self.target = target
         self.pattern = pattern
+        # Counting for a SearchStats runs through the traced node class
+        if stats is not None and tracer is None:
+            tracer = Tracer()
+        self.tracer = tracer
+        self.stats = stats
+        self.node_class = TreeNode if tracer is None else TracedTreeNode
+
+        self.rule_ordering = None
+        if rule_order is not RuleOrder.FIXED:
+            if tracer is not None:
+                raise ValueError("reordered rules cannot be traced or counted")
+            self.rule_ordering = RuleOrdering(
+                OrderedTreeNode, rule_order,
+                static_costs(TreeNode.RULE_COSTS, target, pattern))
+            self.node_class = OrderedTreeNode
 
         self.target_nodes = set(target.nodes())
         self.pattern_nodes = set(pattern.nodes())
@@ -15,8 +52,7 @@ class TreeMatcher:
         self.pattern_node_order = {
             n: i for i, n in enumerate(pattern)}
 
-        self.root_node = TreeNode(self)
-        self.refinement = Refinement(target, pattern, heuristic=heuristic)
+        self.root_node = self.node_class(self)
 
         expected_max_recursion_level = len(target)
         sys.setrecursionlimit(max(
@@ -24,9 +60,63 @@ class TreeMatcher:
             int(1.5 * expected_max_recursion_level)
         ))
 
-
+        self.probe_result = None
+        self.probe_expansions = 0
+        if mode == RefinementMode.AUTO:
+            mode = self.choose_refinement_mode()
+
+        match mode:
+            case RefinementMode.FULL:
+                self.refinement = Refinement(
+                    target, pattern, heuristic=heuristic, combine=combine)
+            case RefinementMode.LAZY:
+                self.refinement = LazyRefinement(
+                    target, pattern, heuristic=heuristic, combine=combine)
+            case RefinementMode.NONE:
+                self.refinement = TrivialRefinement(target, pattern)
+        self.mode = mode
+
+    # A short unrefined search settles easy instances outright. Otherwise
+    # Knuth's estimator over random dives guesses the size of the unrefined
+    # search tree, which is weighed against the |T||P| comparisons a full
+    # table costs.
+    def choose_refinement_mode(self):
+        self.refinement = TrivialRefinement(self.target, self.pattern)
+
+        probe = self.node_class(self)
+        probe.budget = PROBE_EXPANSIONS
+        try:
+            next(probe.match())
+            self.probe_result = True
+        except StopIteration:
+            if probe.expansions < PROBE_EXPANSIONS:
+                self.probe_result = False
+        self.probe_expansions = probe.expansions
+
+        if self.probe_result is not None:
+            mode = RefinementMode.NONE
+            logger.info(f"\tRefinement: none, probe answered "
+                        f"{self.probe_result} in {probe.expansions} "
+                        f"expansions")
+            return mode
+
+        rng = random.Random(0)
+        estimate = sum(self.root_node.sample_tree_size(rng)
+                       for _ in range(ESTIMATE_SAMPLES)) / ESTIMATE_SAMPLES
+        table_size = len(self.target) * len(self.pattern)
+        if estimate < len(self.target):
+            mode = RefinementMode.NONE
+        elif estimate < table_size:
+            mode = RefinementMode.LAZY
+        else:
+            mode = RefinementMode.FULL
+        logger.info(f"\tRefinement: {mode.name.lower()}, estimated tree size "
+                    f"{estimate:.0f} against table size {table_size}")
+        return mode
 
     def subgraph_is_isomorphic(self):
+        if self.probe_result is not None:
+            return self.probe_result
         try:
             next(self.root_node.match())
             return True
@@ -34,13 +124,23 @@ class TreeMatcher:
             return False
 
     def n_expanded_nodes(self):
-        return self.root_node.expansions
+        return self.probe_expansions + self.root_node.expansions
 
 
 @dataclass(order=True)
 class TreeNode:
     priority: int
 
+    RULES = ("rule_refinement", "rule_pred_succ", "rule_cardinality",
+             "rule_new")
+    # (constant, per neighbour) work of each rule, for RuleOrder.DETERMINISTIC
+    RULE_COSTS = {
+        "rule_refinement": (1, 0),
+        "rule_pred_succ": (1, 1),
+        "rule_cardinality": (1, 1),
+        "rule_new": (1, 1),
+    }
+
     def __init__(self, GM):
         self.target = GM.target
         self.pattern = GM.pattern
@@ -58,6 +158,7 @@ class TreeNode:
 
         self.depth = 0
         self.expansions = 0
+        self.budget = float("inf")
 
     def debug_print(self):
         print("Node")
@@ -201,13 +302,79 @@ class TreeNode:
         self.depth -= 1
         self.priority += self.depth
 
+    # Knuth's estimator: follow one random feasible path and sum the
+    # running product of branching factors.
+    def sample_tree_size(self, rng):
+        size = 1
+        width = 1
+        path = []
+        while not self.is_isomorphism():
+            children = [pair for pair in self.generate_candidate_pairs()
+                        if self.syntactic_feasibility(*pair)]
+            if not children:
+                break
+            width *= len(children)
+            size += width
+            pair = rng.choice(children)
+            self.add_node_assignment(*pair)
+            path.append(pair)
+        for pair in reversed(path):
+            self.restore(*pair)
+        return size
+
     def match(self):
         if self.is_isomorphism():
             yield self.target_to_pattern_map
         for target_node, pattern_node in self.generate_candidate_pairs():
             if self.syntactic_feasibility(target_node, pattern_node):
+                if self.expansions >= self.budget:
+                    return
                 self.expansions += 1
                 self.add_node_assignment(target_node, pattern_node)
                 yield from self.match()
                 self.restore(target_node, pattern_node)
 
+
+class TracedTreeNode(TreeNode):
+    def syntactic_feasibility(self, target_node, pattern_node):
+        if self.GM.stats is not None:
+            return self.GM.stats.feasibility(
+                self, self.GM.tracer, target_node, pattern_node)
+        return traced_feasibility(
+            self, self.GM.tracer, target_node, pattern_node)
+
+    def __init__(self, GM):
+        super().__init__(GM)
+        # Children entered so far by each match call on the current path
+        self.children = []
+
+    # Wraps TreeNode.match, which recurses through self.match: every call
+    # below the root enters one child, pushed on entry and popped once its
+    # subtree is done. Solutions are leaves and get no branching entry.
+    # The node's depth is read up front: a search closed at a solution
+    # unwinds without the restores that would bring it back.
+    def match(self):
+        tracer = self.GM.tracer
+        stats = self.GM.stats
+        depth = self.depth
+        if depth:
+            self.children[-1] += 1
+            tracer.push(self)
+        solution = self.is_isomorphism()
+        if solution:
+            tracer.solution(self)
+        self.children.append(0)
+        try:
+            yield from super().match()
+        finally:
+            children = self.children.pop()
+            if stats is not None and not solution:
+                stats.branch(depth, children)
+        if depth:
+            tracer.pop(self)
+
+
+class OrderedTreeNode(TreeNode):
+    def syntactic_feasibility(self, target_node, pattern_node):
+        return self.GM.rule_ordering.feasibility(
+            self, target_node, pattern_node)
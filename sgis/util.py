@@ -1,6 +1,12 @@
+from collections import OrderedDict
 import heapq
+import pickle
+import tempfile
 import numpy as np
 
+# Spilled runs an ExternalPriorityQueue keeps open before merging them
+MAX_RUNS = 64
+
 
 class PriorityQueue:
     def __init__(self):
@@ -19,6 +25,104 @@ class PriorityQueue:
         return item
 
 
+# Priority queue that holds at most `capacity` items in memory. When the
+# heap overflows it is written to a temporary file as a sorted run of
+# encode(item); pops take the smaller of the heap top and the heads of the
+# runs, decoding items read back from disk. Ties are broken by push order
+# as in PriorityQueue, so the pop order is the same.
+class ExternalPriorityQueue(PriorityQueue):
+    def __init__(self, capacity, encode, decode):
+        super().__init__()
+        self.capacity = capacity
+        self.encode = encode
+        self.decode = decode
+        self._heads = []
+        self.n_spilled = 0
+
+    def push(self, item, priority):
+        super().push(item, priority)
+        if len(self._queue) > self.capacity:
+            self.spill()
+
+    def empty(self):
+        return not self._queue and not self._heads
+
+    def pop(self):
+        if self._heads and \
+                (not self._queue or self._heads[0][:2] < self._queue[0][:2]):
+            _, _, encoded, run = heapq.heappop(self._heads)
+            self.next_head(run)
+            return self.decode(encoded)
+        return super().pop()
+
+    def spill(self):
+        run = tempfile.TemporaryFile()
+        for priority, count, item in sorted(self._queue):
+            pickle.dump((priority, count, self.encode(item)), run,
+                        pickle.HIGHEST_PROTOCOL)
+        self.n_spilled += len(self._queue)
+        self._queue = []
+        run.seek(0)
+        self.next_head(run)
+        if len(self._heads) > MAX_RUNS:
+            self.merge_runs()
+
+    def next_head(self, run):
+        try:
+            priority, count, encoded = pickle.load(run)
+        except EOFError:
+            run.close()
+            return
+        heapq.heappush(self._heads, (priority, count, encoded, run))
+
+    def merge_runs(self):
+        heads, self._heads = self._heads, []
+        merged = tempfile.TemporaryFile()
+        for entry in heapq.merge(*(read_run(head) for head in heads)):
+            pickle.dump(entry, merged, pickle.HIGHEST_PROTOCOL)
+        merged.seek(0)
+        self.next_head(merged)
+
+
+# Entries of a spilled run, starting from its head.
+def read_run(head):
+    priority, count, encoded, run = head
+    yield priority, count, encoded
+    while True:
+        try:
+            yield pickle.load(run)
+        except EOFError:
+            run.close()
+            return
+
+
+class LRUCache:
+    def __init__(self, maxsize):
+        self._data = OrderedDict()
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
 def harmonic_mean(arr):
     m = 0
     for i in arr:
@@ -28,3 +132,11 @@ def harmonic_mean(arr):
 def geometric_mean(arr):
     a = np.log(arr)
     return np.exp(a.mean())
+
+
+# Median of values of which those flagged `censored` are only lower
+# bounds. Censored values sort after every exact one, so the median is
+# known exactly while fewer than half are censored and is +inf after.
+def censored_median(arr, censored):
+    values = [float('+inf') if c else v for v, c in zip(arr, censored)]
+    return float(np.median(values)) if values else float('nan')
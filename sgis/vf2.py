@@ -1,11 +1,20 @@
 from dataclasses import dataclass
 import sys
 
+from sgis.ordering import RuleOrder, RuleOrdering, static_costs
+from sgis.trace import Tracer, traced_feasibility
+
 
 class GraphMatcher:
-    def __init__(self, target, pattern):
+    def __init__(self, target, pattern, tracer=None, stats=None,
+                 rule_order=RuleOrder.FIXED):
         self.target = target
         self.pattern = pattern
+        # Counting for a SearchStats runs through the traced node class
+        if stats is not None and tracer is None:
+            tracer = Tracer()
+        self.tracer = tracer
+        self.stats = stats
 
         self.target_nodes = set(target.nodes())
         self.pattern_nodes = set(pattern.nodes())
@@ -13,7 +22,18 @@ class GraphMatcher:
         self.pattern_node_order = {
             n: i for i, n in enumerate(pattern)}
 
-        self.root_node = TreeNode(self)
+        node_class = TreeNode if tracer is None else TracedTreeNode
+
+        self.rule_ordering = None
+        if rule_order is not RuleOrder.FIXED:
+            if tracer is not None:
+                raise ValueError("reordered rules cannot be traced or counted")
+            self.rule_ordering = RuleOrdering(
+                OrderedTreeNode, rule_order,
+                static_costs(TreeNode.RULE_COSTS, target, pattern))
+            node_class = OrderedTreeNode
+
+        self.root_node = node_class(self)
 
         expected_max_recursion_level = len(target)
         sys.setrecursionlimit(max(
@@ -38,6 +58,14 @@ class GraphMatcher:
 class TreeNode:
     priority: int
 
+    RULES = ("rule_pred_succ", "rule_cardinality", "rule_new")
+    # (constant, per neighbour) work of each rule, for RuleOrder.DETERMINISTIC
+    RULE_COSTS = {
+        "rule_pred_succ": (1, 1),
+        "rule_cardinality": (1, 1),
+        "rule_new": (1, 1),
+    }
+
     def __init__(self, GM):
         self.target = GM.target
         self.pattern = GM.pattern
@@ -203,3 +231,47 @@ class TreeNode:
                 yield from self.match()
                 self.restore(target_node, pattern_node)
 
+
+class TracedTreeNode(TreeNode):
+    def syntactic_feasibility(self, target_node, pattern_node):
+        if self.GM.stats is not None:
+            return self.GM.stats.feasibility(
+                self, self.GM.tracer, target_node, pattern_node)
+        return traced_feasibility(
+            self, self.GM.tracer, target_node, pattern_node)
+
+    def __init__(self, GM):
+        super().__init__(GM)
+        # Children entered so far by each match call on the current path
+        self.children = []
+
+    # Wraps TreeNode.match, which recurses through self.match: every call
+    # below the root enters one child, pushed on entry and popped once its
+    # subtree is done. Solutions are leaves and get no branching entry.
+    # The node's depth is read up front: a search closed at a solution
+    # unwinds without the restores that would bring it back.
+    def match(self):
+        tracer = self.GM.tracer
+        stats = self.GM.stats
+        depth = self.depth
+        if depth:
+            self.children[-1] += 1
+            tracer.push(self)
+        solution = self.is_isomorphism()
+        if solution:
+            tracer.solution(self)
+        self.children.append(0)
+        try:
+            yield from super().match()
+        finally:
+            children = self.children.pop()
+            if stats is not None and not solution:
+                stats.branch(depth, children)
+        if depth:
+            tracer.pop(self)
+
+
+class OrderedTreeNode(TreeNode):
+    def syntactic_feasibility(self, target_node, pattern_node):
+        return self.GM.rule_ordering.feasibility(
+            self, target_node, pattern_node)
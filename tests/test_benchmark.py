@@ -0,0 +1,32 @@
+from sgis.benchmark import ENGINES, generate_benchmark_pair, measure
+from sgis.sweep import ordering_columns, run_instance
+from sgis.vf2 import TreeNode
+
+
+def test_fixed_order_has_no_ordering():
+    G, H = generate_benchmark_pair(30, 0.1, 0.75, seed=1)
+    assert measure(ENGINES["vf2"], G, H).ordering is None
+
+
+def test_adaptive_order_counters_in_result_row():
+    # engines, weighted, repeats, warmup, memory, stats, timeout,
+    # memory_limit, load
+    options = (["vf2", "vf2-adaptive"], False, 1, 0, False, False, None,
+               None, None)
+    records = run_instance((40, 0.1, 0.75, 0, 1, *options))
+    fixed, adaptive = records
+    assert fixed["ordering"] is None
+
+    ordering = adaptive["ordering"]
+    assert ordering["mode"] == "adaptive"
+    assert sorted(ordering["rules"]) == sorted(TreeNode.RULES)
+    assert set(ordering["rejected"]) == set(TreeNode.RULES)
+    assert 0 < sum(ordering["rejected"].values()) <= ordering["candidates"]
+    assert adaptive["result"] == fixed["result"]
+
+    columns = ordering_columns([adaptive], "va")
+    for rule in TreeNode.RULES:
+        assert f"va{rule.removeprefix('rule_')}_rejects" in columns
+    assert "vareorderings" in columns
+    assert set(columns["vaorder"].split(">")) == \
+        {rule.removeprefix("rule_") for rule in TreeNode.RULES}
@@ -0,0 +1,41 @@
+import csv
+import os
+
+import networkx as nx
+
+from sgis import sweep
+from sgis.formats import read_instance_list, read_pair
+from sgis.store import ResultStore
+
+LAD_SUITE = os.path.join(os.path.dirname(__file__), "fixtures", "lad",
+                         "instances.txt")
+
+
+def test_read_lad_suite():
+    instances = read_instance_list(LAD_SUITE)
+    assert [name for name, _, _ in instances] == ["path", "triangle"]
+    target, pattern = read_pair(*instances[0][1:])
+    expected = nx.cycle_graph(6)
+    expected.add_edge(0, 3)
+    assert nx.utils.graphs_equal(target, expected)
+    assert nx.utils.graphs_equal(pattern, nx.path_graph(3))
+
+
+def test_sweep_over_lad_suite(tmp_path, capsys):
+    store = tmp_path / "results.csv"
+    sweep.main(["--instances", LAD_SUITE, "--engines", "vf2", "union",
+                "--store", str(store), "--jobs", "1"])
+
+    rows = list(csv.DictReader(capsys.readouterr().out.splitlines()))
+    assert len(rows) == 1
+    assert rows[0]["ntarget"] == "6"
+    assert float(rows[0]["density"]) == round(7 / 15, 4)
+    assert float(rows[0]["ratio"]) == 0.5
+    assert float(rows[0]["accuracy"]) == 1.0
+
+    results = {(r["iteration"], r["engine"]): r["result"]
+               for r in ResultStore(store).records()}
+    assert results == {
+        (0, "vf2"): True, (0, "union"): True,
+        (1, "vf2"): False, (1, "union"): False,
+    }